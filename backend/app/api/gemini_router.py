@@ -1,13 +1,17 @@
-from fastapi import APIRouter, HTTPException, Request, Body
+from fastapi import APIRouter, HTTPException, Request, Body, Depends
 from fastapi.responses import StreamingResponse
 from celery.result import AsyncResult
+from app.core.redis_client import get_async_redis_client
+from app.core.sse import sse_frame
 # 假設您的 Celery App 實例在此 (如果 AsyncResult 需要它):
 # from app.core.celery_app import celery_app 
-import json
 import asyncio
-import traceback
+import logging
+from typing import Any
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/gemini",
     tags=["gemini"],
@@ -16,48 +20,52 @@ router = APIRouter(
 class GeminiInvokeRequest(BaseModel):
     prompt: str
 
-async def gemini_results_sse_generator(task_id: str, request: Request):
-    """SSE 產生器，等待 Celery 任務完成並串流結果。"""
-    print(f"[SSE Gemini Router] SSE 串流已為任務 ID 啟動: {task_id}")
-    yield f"event: system_log\ndata: {json.dumps({'message': 'SSE 連線已建立。正在等待 Gemini 任務完成...', 'task_id': task_id})}\n\n"
+
+async def gemini_results_sse_generator(task_id: str, request: Request, redis_client: Any):
+    """SSE 產生器，等待 Celery 任務完成並串流結果。
+
+    任務完成時 worker 會在 `task_done:{task_id}` 頻道發佈通知 (見 celery_app.py)，
+    因此這裡以 Pub/Sub 阻塞等待，而不是每秒輪詢結果後端。
+    """
+    logger.debug("[SSE Gemini Router] SSE 串流已為任務 ID 啟動: %s", task_id)
+    yield sse_frame("system_log", {'message': 'SSE 連線已建立。正在等待 Gemini 任務完成...', 'task_id': task_id})
 
     try:
         # 如果您的 AsyncResult 需要 app 實例:
         # task_result_obj = AsyncResult(task_id, app=celery_app)
         task_result_obj = AsyncResult(task_id)
 
-        # 迴圈等待任務完成，同時檢查客戶端是否中斷連線
-        while not task_result_obj.ready():
-            if await request.is_disconnected():
-                print(f"[SSE Gemini Router] 客戶端已為任務 ID {task_id} 中斷連線。中止串流。")
-                return
-            
-            # 可選：如果需要，發送保持連線或進度更新
-            # print(f"[SSE Gemini Router] 任務 {task_id} 尚未就緒。目前狀態: {task_result_obj.state}")
-            # yield f"event: progress\ndata: {json.dumps({'message': '任務仍在處理中...', 'state': task_result_obj.state})}\n\n"
-            await asyncio.sleep(1) # 每秒檢查一次狀態
+        async with redis_client.pubsub() as pubsub:
+            await pubsub.subscribe(f"task_done:{task_id}")
+            # 先訂閱再檢查 ready()：若任務在訂閱前就已完成，通知已錯過，直接讀取結果即可
+            while not task_result_obj.ready():
+                if await request.is_disconnected():
+                    logger.info("[SSE Gemini Router] 客戶端已為任務 ID %s 中斷連線。中止串流。", task_id)
+                    return
+                # 阻塞等待完成通知；逾時後回到迴圈頂端重新檢查連線狀態與任務狀態
+                await pubsub.get_message(ignore_subscribe_messages=True, timeout=30.0)
 
         if await request.is_disconnected(): # 任務就緒後再次檢查
-            print(f"[SSE Gemini Router] 客戶端在任務 {task_id} 完成時中斷連線。中止串流。")
+            logger.info("[SSE Gemini Router] 客戶端在任務 %s 完成時中斷連線。中止串流。", task_id)
             return
 
         # 任務已就緒，獲取結果
-        print(f"[SSE Gemini Router] 任務 {task_id} 已就緒。狀態: {task_result_obj.state}")
+        logger.debug("[SSE Gemini Router] 任務 %s 已就緒。狀態: %s", task_id, task_result_obj.state)
         result = task_result_obj.get(timeout=10) # 設定獲取結果的逾時時間
 
         if task_result_obj.successful():
             if isinstance(result, dict) and result.get("status") == "success":
-                print(f"[SSE Gemini Router] 任務 {task_id} 成功完成。")
+                logger.debug("[SSE Gemini Router] 任務 %s 成功完成。", task_id)
                 response_data = {"type": "gemini_response", "content": result.get("content")}
-                yield f"event: result\ndata: {json.dumps(response_data)}\n\n"
-                yield f"event: finish\ndata: {json.dumps({'message': 'Gemini 處理成功完成。'})}\n\n"
+                yield sse_frame("result", response_data)
+                yield sse_frame("finish", {'message': 'Gemini 處理成功完成。'})
             else:
                 # 任務成功，但結果的 status 不是 'success'
                 error_message = "Gemini 任務成功，但返回非預期的結果結構。"
-                print(f"[SSE Gemini Router] 任務 {task_id} {error_message} 結果: {result}")
+                logger.warning("[SSE Gemini Router] 任務 %s %s 結果: %s", task_id, error_message, result)
                 error_response = {"type": "error", "message": error_message, "details": str(result)}
-                yield f"event: error\ndata: {json.dumps(error_response)}\n\n"
-                yield f"event: finish\ndata: {json.dumps({'message': 'Gemini 處理完成，但結果異常。'})}\n\n"
+                yield sse_frame("error", error_response)
+                yield sse_frame("finish", {'message': 'Gemini 處理完成，但結果異常。'})
         else: # 任務失敗 (Celery 層面)
             error_message = f"Celery 任務 {task_id} 回報失敗。"
             details = str(task_result_obj.info) # 包含例外資訊
@@ -65,27 +73,31 @@ async def gemini_results_sse_generator(task_id: str, request: Request):
                 error_message = result.get("error_message", error_message)
                 details = result.get("details", details)
             
-            print(f"[SSE Gemini Router] 任務 {task_id} 失敗。錯誤: {error_message}, 詳情: {details}")
+            logger.warning("[SSE Gemini Router] 任務 %s 失敗。錯誤: %s, 詳情: %s", task_id, error_message, details)
             error_response = {"type": "error", "message": error_message, "details": str(details)}
-            yield f"event: error\ndata: {json.dumps(error_response)}\n\n"
-            yield f"event: finish\ndata: {json.dumps({'message': 'Gemini 處理因錯誤而結束。'})}\n\n"
+            yield sse_frame("error", error_response)
+            yield sse_frame("finish", {'message': 'Gemini 處理因錯誤而結束。'})
 
     except asyncio.CancelledError:
-        print(f"[SSE Gemini Router] 任務 {task_id} 的串流已被取消 (客戶端中斷連線)。")
+        logger.debug("[SSE Gemini Router] 任務 %s 的串流已被取消 (客戶端中斷連線)。", task_id)
     except Exception as e:
-        print(f"[SSE Gemini Router] 任務 {task_id} 的 SSE 串流發生未預期錯誤: {e}")
-        print(traceback.format_exc())
+        logger.exception("[SSE Gemini Router] 任務 %s 的 SSE 串流發生未預期錯誤: %s", task_id, e)
+        import traceback # 只在錯誤路徑需要
         error_info = {"type": "error", "message": f"SSE 串流錯誤: {str(e)}", "details": traceback.format_exc()}
-        yield f"event: error\ndata: {json.dumps(error_info)}\n\n"
-        yield f"event: finish\ndata: {json.dumps({'message': 'Gemini 處理因內部串流錯誤而結束。'})}\n\n"
+        yield sse_frame("error", error_info)
+        yield sse_frame("finish", {'message': 'Gemini 處理因內部串流錯誤而結束。'})
     finally:
-        print(f"[SSE Gemini Router] 任務 {task_id} 的 SSE 串流結束。")
+        logger.debug("[SSE Gemini Router] 任務 %s 的 SSE 串流結束。", task_id)
 
 @router.get("/stream_result/{task_id}")
-async def stream_gemini_result(task_id: str, request: Request):
+async def stream_gemini_result(
+    task_id: str,
+    request: Request,
+    redis_client = Depends(get_async_redis_client)
+):
     """SSE 端點，用於串流 Gemini Celery 任務的結果。"""
     return StreamingResponse(
-        gemini_results_sse_generator(task_id, request),
+        gemini_results_sse_generator(task_id, request, redis_client),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -1,7 +1,7 @@
 # backend/app/api/settings_router.py (or a new app/schemas/settings_schemas.py)
 from pydantic import BaseModel
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.services import config_service
 
 
@@ -35,7 +35,14 @@ router = APIRouter(
 
 
 @router.get("/", response_model=SettingsResponse)
-async def get_settings_route():
+async def get_settings_route(request: Request, response: Response):
+    # ETag follows config.json's mtime, so repeat fetches of unchanged settings get an empty 304
+    etag = config_service.get_settings_etag()
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache" # Always revalidate; the 304 path makes that cheap
     return config_service.get_all_settings()
 
 
@@ -1,19 +1,25 @@
 # backend/app/api/transcribe_router.py
 from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Form, Depends
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, Response
 from app.tasks.transcription_tasks import run_transcription_pipeline
 from app.services import config_service, format_converter_service # Assuming format_converter_service is created
-from app.core.redis_client import get_async_redis_client # Use async for SSE
+from app.core.redis_client import get_async_redis_bytes_client # Use async (bytes mode) for SSE
+from app.core.sse import SSE_KEEPALIVE_FRAME, sse_frame, sse_frame_raw
+from redis.exceptions import ConnectionError as RedisConnectionError
 import uuid
 import os
+from urllib.parse import quote
 import tempfile
 import shutil
-import json
+import orjson
 import asyncio
-from typing import List, Dict, Any, Optional
+import logging
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/transcribe",
     tags=["transcription"],
@@ -23,16 +29,26 @@ router = APIRouter(
 TEMP_UPLOAD_DIR = "temp_uploads" # Create this dir in backend root, or use tempfile.gettempdir()
 os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
 
+UPLOAD_COPY_CHUNK_SIZE = 1 << 20 # 1 MiB per read keeps memory bounded for large audio files
+
+def _copy_upload_to_fd(src, fd: int) -> None:
+    """Blocking copy of the spooled upload into the temp file; runs in a worker thread."""
+    with os.fdopen(fd, "wb") as tmp:
+        shutil.copyfileobj(src, tmp, UPLOAD_COPY_CHUNK_SIZE)
+
 async def save_upload_file_tmp(upload_file: UploadFile) -> str:
     try:
         # Use a unique prefix to help identify these files for cleanup
         fd, temp_path = tempfile.mkstemp(suffix=f"_{upload_file.filename}", prefix="fastapi_temp_upload_", dir=TEMP_UPLOAD_DIR)
-        with os.fdopen(fd, "wb") as tmp:
-            shutil.copyfileobj(upload_file.file, tmp)
+        # Copy off the event loop so SSE streams and other requests stay responsive during large uploads
+        await asyncio.to_thread(_copy_upload_to_fd, upload_file.file, fd)
         return temp_path
     finally:
         await upload_file.close() # Ensure file is closed
 
+SSE_KEEPALIVE_SECONDS = 15.0
+SSE_MAX_FRAMES_PER_WRITE = 64 # Upper bound on frames coalesced into a single write
+
 # --- Pydantic Models for this router ---
 class TranscriptionStartResponse(BaseModel):
     task_id: str
@@ -81,48 +97,91 @@ async def start_transcription_route(files: List[UploadFile] = File(...)):
     )
 
 
-async def sse_event_generator(task_id: str, request: Request, redis_client: Any): # redis_client is aioredis.Redis
+def _event_frame(task_id: str, data: bytes) -> Tuple[bytes, str]:
+    """Turns one raw pub/sub payload into an SSE frame; returns (frame, event_type)."""
+    try:
+        payload = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        payload = None
+    if isinstance(payload, dict):
+        event_type = payload.get("type", "message") # Default event type for safety
+        # The name goes on the `event:` line, so it must be a single-line string
+        if isinstance(event_type, str) and "\n" not in event_type and "\r" not in event_type:
+            # Forward the published JSON unchanged; only the event name needs parsing
+            return sse_frame_raw(event_type, data), event_type
+    # Not a JSON object with a usable "type" (invalid JSON, a bare string/number/array, ...):
+    # send it as a raw message and log it
+    data_str = data.decode("utf-8", errors="replace")
+    logger.warning("Received unexpected message on Redis for task %s: %s", task_id, data_str)
+    return sse_frame("raw_message", {'content': data_str}), "raw_message"
+
+
+async def sse_event_generator(task_id: str, request: Request, redis_client: Any): # redis_client is a bytes-mode aioredis.Redis
     async with redis_client.pubsub() as pubsub:
-        await pubsub.subscribe(f"task_events:{task_id}")
+        try:
+            await pubsub.subscribe(f"task_events:{task_id}")
+        except RedisConnectionError as e:
+            # Pool exhausted (no connection freed within the pool timeout) or Redis unreachable.
+            # Headers are already sent, so report it in-band instead of breaking the stream.
+            logger.warning("SSE stream for task %s could not subscribe to Redis: %s", task_id, e)
+            yield sse_frame("error", {'type': 'error', 'message': 'Event stream is unavailable (Redis connection limit reached or Redis unreachable). Please retry.'})
+            yield sse_frame("finish", {'type': 'finish'})
+            return
         # First, send a confirmation that SSE is connected
-        yield f"event: system_log\ndata: {json.dumps({'message': 'SSE connection established.'})}\n\n"
+        yield sse_frame("system_log", {'message': 'SSE connection established.'})
+        loop = asyncio.get_running_loop()
+        last_send = loop.time()
         try:
             while True:
                 if await request.is_disconnected():
-                    print(f"SSE client for task {task_id} disconnected.")
+                    logger.debug("SSE client for task %s disconnected.", task_id)
                     break # Exit loop if client disconnects
 
-                # Listen for messages from Redis Pub/Sub
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0) # 1s timeout
-                if message and message["type"] == "message":
-                    data_str = message['data']
-                    try:
-                        event_payload = json.loads(data_str)
-                        event_type = event_payload.get("type", "message") # Default event type for safety
-                        yield f"event: {event_type}\ndata: {data_str}\n\n"
-
-                        if event_type == "finish" or event_type == "error": # Stop streaming after these final events
-                            print(f"SSE stream for task {task_id} ending due to '{event_type}' event.")
-                            
-                    except json.JSONDecodeError:
-                        # If data is not valid JSON, send it as a raw message or log an error
-                        yield f"event: raw_message\ndata: {json.dumps({'content': data_str})}\n\n"
-                        print(f"Warning: Received non-JSON message on Redis for task {task_id}: {data_str}")
-
-                await asyncio.sleep(0.01) # Small delay to prevent tight loop if no messages
+                # Listen for messages from Redis Pub/Sub; the timeout does the waiting, no extra sleep needed
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE_SECONDS)
+                if message is None:
+                    if loop.time() - last_send >= SSE_KEEPALIVE_SECONDS:
+                        yield SSE_KEEPALIVE_FRAME # Comment frame keeps idle connections (and proxies) alive
+                        last_send = loop.time()
+                    continue
+
+                # Drain whatever else is already buffered (non-blocking) so a burst of
+                # progress events goes out as one write instead of one send per event
+                frames: List[bytes] = []
+                finished = False
+                while message is not None:
+                    if message["type"] == "message":
+                        frame, event_type = _event_frame(task_id, message['data'])
+                        frames.append(frame)
+                        # "error" events can be non-fatal (e.g. one chunk failed), but the task
+                        # always publishes "finish" last, so that is the end of the stream.
+                        if event_type == "finish":
+                            finished = True
+                            break
+                    if len(frames) >= SSE_MAX_FRAMES_PER_WRITE:
+                        break
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+
+                if frames:
+                    yield b"".join(frames)
+                    last_send = loop.time()
+                if finished:
+                    logger.debug("SSE stream for task %s ending due to 'finish' event.", task_id)
+                    break
 
         except asyncio.CancelledError:
-            print(f"SSE generator for task {task_id} was cancelled (client likely disconnected).")
+            logger.debug("SSE generator for task %s was cancelled (client likely disconnected).", task_id)
         finally:
-            print(f"Cleaning up SSE generator for task {task_id}. Unsubscribing from Redis.")
+            logger.debug("Cleaning up SSE generator for task %s. Unsubscribing from Redis.", task_id)
             await pubsub.unsubscribe(f"task_events:{task_id}")
+            # Leaving `async with` closes the pubsub, returning its connection to the pool even on errors
 
 
 @router.get("/stream/{task_id}")
 async def stream_task_events_route(
     task_id: str,
     request: Request, # FastAPI injects the request object
-    redis_client = Depends(get_async_redis_client) # Dependency injection for async Redis
+    redis_client = Depends(get_async_redis_bytes_client) # Dependency injection for async Redis (bytes mode)
 ):
     return StreamingResponse(
         sse_event_generator(task_id, request, redis_client),
@@ -148,6 +207,13 @@ async def stream_task_events_route(
 
 # Continuing backend/app/api/transcribe_router.py
 
+def _content_disposition(filename: str) -> str:
+    """Attachment header; non-ASCII names (e.g. Japanese titles) use the RFC 5987 filename* form."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
 @router.post("/download")
 async def download_transcription_file_route(payload: DownloadRequest):
     if not payload.transcription_text_srt:
@@ -180,19 +246,10 @@ async def download_transcription_file_route(payload: DownloadRequest):
     base_name = os.path.splitext(payload.original_filename)[0] if payload.original_filename else "transcription"
     download_filename = f"{base_name}{file_extension}"
 
-    # Use tempfile to serve the content, FastAPI's FileResponse handles cleanup for NamedTemporaryFile
-    try:
-        # Create a named temporary file to pass its path to FileResponse
-        # Delete=False is important so FileResponse can read it before it's auto-deleted on close
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=file_extension, encoding="utf-8-sig") as tmp_file:
-            tmp_file.write(output_text)
-            temp_file_path = tmp_file.name
-
-        return FileResponse(
-            path=temp_file_path,
-            filename=download_filename,
-            media_type=media_type,
-            background=tempfile.NamedTemporaryFile(tmp_file.name) # Ensures cleanup after response
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to prepare download file: {str(e)}")
+    # The converted text is already in memory, so send it directly: no temp file to write, re-read or clean up.
+    body = output_text.encode("utf-8-sig") # Keep the BOM so editors detect UTF-8 for CJK subtitles
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": _content_disposition(download_filename)}
+    )
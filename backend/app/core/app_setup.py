@@ -1,7 +1,39 @@
 # backend/app/core/app_setup.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-app = FastAPI(title="Mortis Transcription API", version="1.0.0")
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from fastapi.responses import ORJSONResponse
+from app.core.redis_client import close_async_redis_pool
+from app.services import config_service
+logger = logging.getLogger(__name__)
+class SSEAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that never compresses SSE streams.
+
+    A compressor buffers output, which breaks SSE's push-immediately semantics.
+    EventSource always sends `Accept: text/event-stream`, so those requests bypass gzip.
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        # Pre-import the Google SDK (grpc/protobuf) and build the client for the saved API key so the
+        # first request doesn't pay for it; both block, so run them off the event loop
+        await asyncio.to_thread(config_service.preload_model_client)
+    except Exception as e:
+        # Warm-up is best-effort: a bad key or missing SDK surfaces on the request that needs it
+        logger.warning("Gemini client warm-up skipped: %s", e)
+    yield
+    await close_async_redis_pool()
+# ORJSONResponse: every JSON response is encoded with orjson (non-ASCII is never escaped)
+app = FastAPI(title="Mortis Transcription API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 # CORS (Cross-Origin Resource Sharing) Middleware
 # TODO: Adjust origins for production
 origins = [
@@ -16,6 +48,8 @@ app.add_middleware(
     allow_methods=["*"], # Allows all methods
     allow_headers=["*"], # Allows all headers
 )
+# Compress JSON and subtitle downloads (SRT/VTT can be 100+ KB); SSE is left untouched
+app.add_middleware(SSEAwareGZipMiddleware, minimum_size=1024, compresslevel=5)
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok"}
\ No newline at end of file
@@ -1,6 +1,39 @@
 # backend/app/core/celery_app.py
+import logging
 from celery import Celery
+from celery.signals import task_postrun
+import orjson
 from .config import settings
+from .redis_client import get_sync_redis_client
+
+logger = logging.getLogger(__name__)
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+def _default_worker_pool() -> str:
+    """The configured pool, or threads if gevent was requested but the process was never patched.
+
+    Patching only works before celery, kombu, ssl and threading are imported, which is before the
+    -A module is loaded. Only `-P gevent` on the command line does that (celery patches in its
+    __main__). A pool selected through CELERY_WORKER_POOL alone would run unpatched and block on
+    every socket, so it falls back to threads.
+    """
+    pool = settings.CELERY_WORKER_POOL
+    if pool.lower() != "gevent" or _gevent_patched():
+        return pool
+    logger.warning("CELERY_WORKER_POOL=gevent but the process is not monkey-patched "
+                   "(start the worker with -P gevent); falling back to threads.")
+    return "threads"
+
+if _gevent_patched():
+    # The Gemini SDK talks gRPC, whose core runs its own I/O threads; let them yield to the gevent hub
+    import grpc.experimental.gevent as grpc_gevent
+    grpc_gevent.init_gevent()
 
 celery_app = Celery(
     "worker",  # Default name for the worker
@@ -11,6 +44,32 @@ celery_app = Celery(
 )
 celery_app.conf.update(
     task_track_started=True,
-    # Optional: Configure other Celery settings if needed
-    # result_expires=3600,
+    # Results are read once by the SSE endpoint; expire them so the result keyspace doesn't grow unbounded
+    result_expires=3600,
+    # Result backend connection: keepalive + retries so AsyncResult.get isn't stalled by a dead socket.
+    # (The redis result backend already waits on results via pub/sub, not by polling.)
+    redis_socket_keepalive=True,
+    redis_retry_on_timeout=True,
+    redis_backend_health_check_interval=30,
+    # Broker connection: keepalive; visibility_timeout must exceed the longest transcription,
+    # otherwise an unacked (acks_late) task is redelivered to another worker
+    broker_transport_options={'visibility_timeout': 6 * 3600, 'socket_keepalive': True, 'health_check_interval': 30},
+    # Long tasks: ack after completion and don't let one worker hoard queued tasks
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    # Default pool for `celery worker` (overridable with -P / -c)
+    worker_pool=_default_worker_pool(),
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
 )
+
+@task_postrun.connect
+def _notify_task_done(task_id=None, state=None, **kwargs):
+    """Publishes a completion notice so SSE listeners can wake up instead of polling AsyncResult.
+
+    task_postrun fires after the result has been stored in the backend, so a listener
+    that receives this message can read the result immediately.
+    """
+    try:
+        get_sync_redis_client().publish(f"task_done:{task_id}", orjson.dumps({"task_id": task_id, "state": state}))
+    except Exception:
+        logger.exception("Failed to publish task completion to Redis for task %s", task_id)
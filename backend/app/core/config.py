@@ -6,5 +6,29 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/2"
     REDIS_PUB_SUB_URL: str = "redis://localhost:6379/0"
+    # Tasks mostly wait on Gemini (gRPC) calls: a thread pool overlaps them without extra processes.
+    # gevent (with a high concurrency) is supported as an opt-in, but only via `-P gevent` on the celery
+    # command line, which monkey-patches early enough; celery_app then enables gRPC's gevent integration.
+    # Set here without -P it falls back to threads. It is not the default because VAD inference is
+    # CPU-bound and blocks the gevent hub (every other task's I/O) while it runs.
+    CELERY_WORKER_POOL: str = "threads"
+    CELERY_WORKER_CONCURRENCY: int = 8
+    # Chunks uploaded/transcribed concurrently per task (bounded by the Gemini quota)
+    MORTIS_CHUNK_CONCURRENCY: int = 3
+    # Emit per-chunk detail logs from the transcription orchestrator
+    ORCHESTRATOR_DEBUG: bool = False
+    # torch intra-op threads for VAD inference (0 = all CPU cores; VAD runs are serialized per worker)
+    TORCH_INTRAOP_THREADS: int = 0
+    # Skip Silero on windows whose energy stays near the adaptive noise floor. Faster on audio with
+    # long silences, but skipped windows count as probability 0, so quiet speech close to the noise
+    # floor can be missed or have its segment edges moved. Off by default to keep VAD output unchanged.
+    VAD_ENERGY_PREFILTER: bool = False
+    # Reuse identical uploads (same audio bytes, same API key) across tasks instead of re-uploading.
+    # Reused files are kept on Gemini until they expire (48 h) rather than deleted after each task.
+    GEMINI_FILE_REUSE: bool = False
+    GEMINI_FILE_REGISTRY_PATH: str = "~/.mortis/gemini_registry.json"
+    # Cache the transcription prompt (cachedContents) when it reaches this many tokens, the model's
+    # context-cache minimum; chunk requests then send only the audio. 0 disables prompt caching.
+    GEMINI_PROMPT_CACHE_MIN_TOKENS: int = 1024
     # Add other global configurations if needed
 settings = Settings()
\ No newline at end of file
@@ -1,14 +1,132 @@
 # backend/app/core/redis_client.py
 import redis.asyncio as aioredis # For FastAPI SSE
 import redis # For Celery tasks (sync client often simpler there)
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional, Union
 from .config import settings
+
+logger = logging.getLogger(__name__)
 # Async client for FastAPI (e.g., for SSE pub/sub)
-async_redis_pool = aioredis.from_url(settings.REDIS_PUB_SUB_URL, decode_responses=True)
+# Bounded pool with TCP keepalive + periodic health checks so dead sockets don't stall pub/sub subscriptions.
+# Blocking: when every connection is busy, callers wait up to REDIS_POOL_TIMEOUT_SECONDS for one to be
+# released instead of getting MaxConnectionsError immediately.
+REDIS_POOL_TIMEOUT_SECONDS = 20
+async_redis_connection_pool = aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_PUB_SUB_URL,
+    decode_responses=True,
+    max_connections=256,
+    timeout=REDIS_POOL_TIMEOUT_SECONDS,
+    socket_keepalive=True,
+    health_check_interval=30,
+)
+async_redis_pool = aioredis.Redis(connection_pool=async_redis_connection_pool)
+# Bytes-mode client (no decode_responses) for SSE pub/sub: payloads are parsed with orjson straight
+# from bytes and forwarded to the client as-is, skipping a UTF-8 decode + re-encode per message.
+# Every open SSE stream holds one connection; a blocking pool makes stream 65+ wait for a free
+# connection (up to REDIS_POOL_TIMEOUT_SECONDS) instead of failing at once with MaxConnectionsError.
+async_redis_bytes_connection_pool = aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_PUB_SUB_URL,
+    max_connections=64,
+    timeout=REDIS_POOL_TIMEOUT_SECONDS,
+    socket_keepalive=True,
+    health_check_interval=30,
+)
+async_redis_bytes_client = aioredis.Redis(connection_pool=async_redis_bytes_connection_pool)
 # Sync client for Celery tasks or synchronous parts of services
-sync_redis_client = redis.Redis.from_url(settings.REDIS_PUB_SUB_URL, decode_responses=True)
+sync_redis_client = redis.Redis.from_url(settings.REDIS_PUB_SUB_URL, decode_responses=True, socket_keepalive=True, health_check_interval=30)
 async def get_async_redis_client():
     """Dependency for FastAPI to get an async Redis client."""
     return async_redis_pool
+async def get_async_redis_bytes_client():
+    """Dependency for FastAPI to get an async Redis client that returns raw bytes (for SSE pub/sub)."""
+    return async_redis_bytes_client
 def get_sync_redis_client():
     """Utility to get a sync Redis client."""
-    return sync_redis_client
\ No newline at end of file
+    return sync_redis_client
+
+class RedisEventBatcher:
+    """Publishes pub/sub messages from a background thread, one pipeline round trip per batch.
+
+    emit() only enqueues, so callers on the transcription hot path never wait on Redis. The
+    thread sends a batch once max_batch messages are queued or flush_interval has passed since
+    the first one. Messages keep their emit order. flush() blocks until everything emitted
+    before it has been sent.
+    """
+    def __init__(self, client: redis.Redis, flush_interval: float = 0.02, max_batch: int = 32):
+        self._client = client
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._start_lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        # Messages lost to failed batch publishes since the process started (only the batcher thread writes it)
+        self.dropped_messages = 0
+
+    def _ensure_started(self) -> queue.Queue:
+        # Started lazily in the process that emits: under prefork a thread started in the parent
+        # does not survive the fork, so each child starts its own
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,), name="redis-event-batcher", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def emit(self, channel: str, message: Union[str, bytes]) -> None:
+        self._ensure_started().put((channel, message))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Waits until all messages emitted so far are published; returns False on timeout."""
+        if self._pid != os.getpid():
+            return True # Nothing emitted in this process yet
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            batch = [q.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            messages = [item for item in batch if not isinstance(item, threading.Event)]
+            if messages:
+                try:
+                    pipe = self._client.pipeline(transaction=False)
+                    for channel, message in messages:
+                        pipe.publish(channel, message)
+                    pipe.execute()
+                except Exception:
+                    # The frontend misses these updates; log to the worker output and keep going.
+                    # A dropped "finish" event leaves the SSE client waiting for the task_done fallback.
+                    self.dropped_messages += len(messages)
+                    logger.exception("Failed to publish %d batched event(s) to Redis on %s (%d dropped in total)",
+                                     len(messages), sorted({channel for channel, _ in messages}), self.dropped_messages)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+# Shared per process (Celery worker): task events from all concurrent tasks go through one batcher
+task_event_batcher = RedisEventBatcher(sync_redis_client)
+def get_task_event_batcher() -> RedisEventBatcher:
+    """Utility to get the process-wide task event batcher."""
+    return task_event_batcher
+async def close_async_redis_pool():
+    """Closes the async clients and disconnects every pooled connection (call on app shutdown)."""
+    await async_redis_pool.aclose()
+    await async_redis_connection_pool.disconnect()
+    await async_redis_bytes_client.aclose()
+    await async_redis_bytes_connection_pool.disconnect()
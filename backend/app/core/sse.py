@@ -0,0 +1,20 @@
+# backend/app/core/sse.py
+import functools
+import orjson
+
+# Server-Sent Events frames, built as bytes (StreamingResponse sends bytes as-is).
+# Shared by every SSE endpoint so they all produce frames the same way.
+SSE_KEEPALIVE_FRAME = b": ping\n\n" # SSE comment line, ignored by EventSource
+
+@functools.lru_cache(maxsize=32)
+def event_prefix(event: str) -> bytes:
+    """Encoded `event: <name>` + `data: ` envelope; there are only a handful of event names, so each is built once."""
+    return b"event: " + event.encode() + b"\ndata: "
+
+def sse_frame_raw(event: str, data: bytes) -> bytes:
+    """Wraps an already-encoded JSON payload in an SSE frame."""
+    return event_prefix(event) + data + b"\n\n"
+
+def sse_frame(event: str, payload: dict) -> bytes:
+    """Builds a single SSE frame from a JSON-serializable payload."""
+    return sse_frame_raw(event, orjson.dumps(payload))
@@ -1,7 +1,9 @@
 # backend/app/services/config_service.py
-import json
+import functools
+import orjson
 import os
-from typing import Dict, List, Optional, Any
+import tempfile
+from typing import Dict, List, Optional, Any, Tuple
 CONFIG_FILE_PATH = "config.json" # Relative to backend directory root
 # 從原專案 config.py 移植並調整以下常量和函式
 SUPPORTED_PROVIDERS = ["Google"] # 目前只專注 Google 可用功能
@@ -15,7 +17,41 @@ DEFAULT_GOOGLE_AVAILABLE_MODELS = [
     "gemini-1.0-pro",
     "gemini-pro-vision" # 如果也想測試 vision
 ]
+# orjson 直接輸出 bytes；OPT_INDENT_2 維持原本 indent=2 的排版，且本身不跳脫非 ASCII 字元
+_JSON_DUMP_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+# 已解析設定的快取: (config.json 的 st_mtime_ns, 設定 dict)；檔案未變動時直接回傳
+_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+def _config_mtime_ns() -> int:
+    try:
+        return os.stat(CONFIG_FILE_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+def _atomic_write(data: bytes, path: str) -> None:
+    """寫入同目錄的暫存檔後以 os.replace 原子替換，避免寫到一半當機而損毀設定檔。"""
+    dir_name = os.path.dirname(os.path.abspath(path)) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix=".cfg_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp 建立的檔案權限為 0600；沿用原檔權限 (新檔則用 0644)
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 def _load_or_create_config() -> Dict[str, Any]:
+    global _cache
+    mtime_ns = _config_mtime_ns()
+    if _cache is not None and _cache[0] == mtime_ns:
+        return _cache[1]
+    config_data = _read_or_create_config()
+    # 讀取過程可能補寫了缺失鍵，因此重新取得 mtime 作為快取鍵
+    _cache = (_config_mtime_ns(), config_data)
+    return config_data
+def _read_or_create_config() -> Dict[str, Any]:
     default_structure = {
         "api_key": {API_KEY_FIELDS["Google"]: ""},
         AVAILABLE_MODELS_FIELD: {"Google": DEFAULT_GOOGLE_AVAILABLE_MODELS},
@@ -24,12 +60,11 @@ def _load_or_create_config() -> Dict[str, Any]:
         SELECTED_MODELS_FIELD: {"Google": DEFAULT_GOOGLE_AVAILABLE_MODELS[0] if DEFAULT_GOOGLE_AVAILABLE_MODELS else None}
     }
     if not os.path.exists(CONFIG_FILE_PATH):
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(default_structure, f, indent=2, ensure_ascii=False)
+        _atomic_write(orjson.dumps(default_structure, option=_JSON_DUMP_OPTIONS), CONFIG_FILE_PATH)
         return default_structure
     try:
-        with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
+        with open(CONFIG_FILE_PATH, 'rb') as f:
+            config_data = orjson.loads(f.read())
         # 基本驗證與合併缺失鍵
         updated = False
         for key, value in default_structure.items():
@@ -54,14 +89,12 @@ def _load_or_create_config() -> Dict[str, Any]:
             config_data.setdefault(SELECTED_MODELS_FIELD, {})["Google"] = DEFAULT_GOOGLE_AVAILABLE_MODELS[0] if DEFAULT_GOOGLE_AVAILABLE_MODELS else None
             updated = True
         if updated:
-            with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=2, ensure_ascii=False)
+            _atomic_write(orjson.dumps(config_data, option=_JSON_DUMP_OPTIONS), CONFIG_FILE_PATH)
         return config_data
-    except (json.JSONDecodeError, IOError) as e:
+    except (orjson.JSONDecodeError, IOError) as e:
         print(f"Error loading or creating config file: {e}. Returning default structure.")
         # If error, overwrite with default to ensure app can run
-        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(default_structure, f, indent=2, ensure_ascii=False)
+        _atomic_write(orjson.dumps(default_structure, option=_JSON_DUMP_OPTIONS), CONFIG_FILE_PATH)
         return default_structure
 def get_all_settings() -> Dict[str, Any]:
     config = _load_or_create_config()
@@ -71,12 +104,18 @@ def get_all_settings() -> Dict[str, Any]:
         "google_available_models": config.get(AVAILABLE_MODELS_FIELD, {}).get("Google", []),
         "prompt": config.get(PROMPT_FIELD, "")
     }
+def get_settings_etag() -> str:
+    """以快取中 config.json 的 mtime 產生弱 ETag；設定檔未變動時 ETag 不變。"""
+    _load_or_create_config() # 確保快取與目前檔案一致
+    return f'W/"{_cache[0]:x}"'
 def update_settings(
     google_api_key: Optional[str] = None,
     google_selected_model: Optional[str] = None,
     prompt: Optional[str] = None
 ) -> Dict[str, Any]:
+    global _cache
     config = _load_or_create_config()
+    _cache = None # 以下會修改快取中的 dict 並覆寫檔案，先讓快取失效
     if google_api_key is not None:
         config["api_key"][API_KEY_FIELDS["Google"]] = google_api_key
     if google_selected_model is not None:
@@ -84,33 +123,30 @@ def update_settings(
         config[SELECTED_MODELS_FIELD]["Google"] = google_selected_model
     if prompt is not None:
         config[PROMPT_FIELD] = prompt
-    with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    _atomic_write(orjson.dumps(config, option=_JSON_DUMP_OPTIONS), CONFIG_FILE_PATH)
     return get_all_settings()
 # 從原專案 app.py 移植 test_api_key_model，簡化為只測 Google
-# 需要 google-generativeai
-import google.generativeai as genai
+# 需要 google-generativeai (google.ai.generativelanguage 為其底層 client)
+@functools.lru_cache(maxsize=32)
+def _get_model_client(api_key: str) -> Any:
+    # 延遲匯入：SDK 會拉進 grpc/protobuf，只有測試 API 時才需要，避免拖慢 API 與 worker 啟動
+    import google.ai.generativelanguage as glm
+    # 每個 API Key 一個 client 並重複使用；不同於 genai.configure，不會改動全域狀態
+    return glm.ModelServiceClient(client_options={"api_key": api_key})
+def preload_model_client() -> None:
+    # 啟動時預先匯入 SDK 並為已儲存的 API Key 建立 client，首次測試 API 的請求不必負擔這段成本
+    api_key = get_all_settings().get("google_api_key")
+    if api_key:
+        _get_model_client(api_key)
 def test_google_api(api_key: str, model_name: str) -> Dict[str, Any]:
     if not api_key:
         return {"success": False, "message": "請提供 Google API Key。"}
     if not model_name:
         return {"success": False, "message": "請提供 Google 模型名稱。"}
     try:
-        genai.configure(api_key=api_key)
-        # Check if model exists by trying to get it.
-        # The format for get_model might be just model_name, or "models/model_name"
-        # Let's assume `model_name` is directly usable.
-        # If Gemini SDK provides a list_models or check_model_availability that's better.
-        # For now, trying to get it is a common pattern.
-        model_to_test = genai.GenerativeModel(model_name) # This might not raise error until first call
-        # Let's try a minimal call if model instantiation doesn't validate
-        # response = model_to_test.generate_content("test", generation_config=genai.types.GenerationConfig(max_output_tokens=1))
-        # A safer check might be to list models if API supports it and see if model_name is present
-        # For simplicity, we'll assume genai.GenerativeModel(model_name) is enough or try a quick generation.
-        # Let's just try to initialize. Actual API call test might be too slow for UI feedback.
-        # Or, the SDK might have a specific validation method.
-        # Referencing `genai.get_model(f'models/{model_name}')` from original `app.py`
-        genai.get_model(f'models/{model_name}') # This seems to be the intended check
+        # Referencing `genai.get_model(f'models/{model_name}')` from original `app.py`:
+        # a single GetModel call validates both the key and the model name.
+        _get_model_client(api_key).get_model(name=f'models/{model_name}')
         return {"success": True, "message": f"Google API Key 和模型 '{model_name}' 測試成功！"}
     except Exception as e:
         return {"success": False, "message": f"Google API 測試失敗 (模型: {model_name}): {str(e)}"}
\ No newline at end of file
@@ -1,58 +1,40 @@
 # backend/app/services/format_converter_service.py
+import io
 import re
-from typing import Optional, List, Tuple
+from typing import List, NamedTuple
 
 # --- SRT/VTT Time Parsing and Formatting --- #
 
-def _parse_srt_timestamp_to_seconds(time_str: str) -> Optional[float]:
-    """Converts HH:MM:SS,mmm string to total seconds."""
-    match = re.match(r'(\d{2}):(\d{2}):(\d{2}),(\d{3})', time_str)
-    if match:
-        h, m, s, ms = map(int, match.groups())
-        return h * 3600 + m * 60 + s + ms / 1000.0
-    return None
+# Compiled once at import; captures both timestamps' components so a cue's time line needs a single match.
+_SRT_TIME_LINE_RE = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}),(\d{3})')
 
-def _format_seconds_to_srt_vtt_timestamp(seconds: float, format_type: str = 'srt') -> str:
-    """Formats total seconds to HH:MM:SS,sss (srt) or HH:MM:SS.sss (vtt)."""
-    if seconds < 0: seconds = 0
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int(round((seconds - int(seconds)) * 1000))
-    
-    if millis >= 1000: # Handle rounding that pushes millis to 1000 or more
-        millis = 0
-        secs += 1
-        if secs >= 60:
-            secs = 0
-            minutes += 1
-            if minutes >= 60:
-                minutes = 0
-                hours += 1
-    
-    separator = ',' if format_type == 'srt' else '.'
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+# Bound str.format methods, created once; picked per call instead of rebuilding an f-string layout.
+_SRT_TMPL = "{:02d}:{:02d}:{:02d},{:03d}".format
+_VTT_TMPL = "{:02d}:{:02d}:{:02d}.{:03d}".format
+_LRC_TMPL = "[{:02d}:{:02d}.{:02d}]".format
 
-def _format_seconds_to_lrc_timestamp(seconds: float) -> str:
-    """Formats total seconds to [mm:ss.xx] for LRC."""
-    if seconds < 0: seconds = 0
-    minutes = int(seconds // 60)
-    secs = int(seconds % 60)
-    # For LRC, it's common to use centiseconds (2 digits)
-    centis = int(round((seconds - int(seconds)) * 100))
-    if centis >= 100: # Handle rounding for centiseconds
-        centis = 0
-        secs += 1
-        if secs >= 60:
-            secs = 0
-            minutes += 1
-    return f"[{minutes:02d}:{secs:02d}.{centis:02d}]"
+def _format_ms_to_srt_vtt_timestamp(total_ms: int, format_type: str = 'srt') -> str:
+    """Formats total milliseconds to HH:MM:SS,sss (srt) or HH:MM:SS.sss (vtt)."""
+    # Integer milliseconds split with divmod: no float ops per field, no carry cascade
+    secs, millis = divmod(max(0, total_ms), 1000)
+    minutes, secs = divmod(secs, 60)
+    hours, minutes = divmod(minutes, 60)
+    return (_SRT_TMPL if format_type == 'srt' else _VTT_TMPL)(hours, minutes, secs, millis)
+
+def _format_ms_to_lrc_timestamp(total_ms: int) -> str:
+    """Formats total milliseconds to [mm:ss.xx] for LRC."""
+    # For LRC, it's common to use centiseconds (2 digits); minutes are not wrapped into hours.
+    # Rounded once from the parsed integer milliseconds (no float round trip)
+    total_centis = (max(0, total_ms) + 5) // 10
+    minutes, centis = divmod(total_centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return _LRC_TMPL(minutes, secs, centis)
 
 # --- SRT Parsing Helper --- #
-class SRTEntry(Tuple[int, float, float, List[str]]):
+class SRTEntry(NamedTuple):
     index: int
-    start_time_sec: float
-    end_time_sec: float
+    start_ms: int
+    end_ms: int
     text_lines: List[str]
 
 def _parse_srt_content(srt_text: str) -> List[SRTEntry]:
@@ -61,35 +43,40 @@ def _parse_srt_content(srt_text: str) -> List[SRTEntry]:
         return []
     
     entries: List[SRTEntry] = []
-    srt_blocks_raw = re.split(r'\\n\\s*\\n', srt_text.strip())
-    srt_blocks = [block.strip() for block in srt_blocks_raw if block.strip()]
-
-    for block_str in srt_blocks:
-        lines = block_str.split('\\n')
-        if len(lines) < 3: # Index, Time, Text (at least one line)
+    # One linear scan over the lines: a cue block is a run of non-blank lines
+    # (index, time line, text...), blocks are separated by blank lines.
+    lines = srt_text.splitlines()
+    line_count = len(lines)
+    i = 0
+    while i < line_count:
+        if not lines[i].strip():
+            i += 1
+            continue
+        block_start = i
+        while i < line_count and lines[i].strip():
+            i += 1
+        if i - block_start < 3: # Index, Time, Text (at least one line)
             continue
         
         try:
-            index = int(lines[0])
+            index = int(lines[block_start])
         except ValueError:
             continue # Invalid index
             
-        time_line_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', lines[1])
+        time_line_match = _SRT_TIME_LINE_RE.match(lines[block_start + 1])
         if not time_line_match:
             continue # Invalid time line
             
-        start_time_str, end_time_str = time_line_match.groups()
-        start_time_sec = _parse_srt_timestamp_to_seconds(start_time_str)
-        end_time_sec = _parse_srt_timestamp_to_seconds(end_time_str)
+        h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, time_line_match.groups())
+        start_ms = ((h1 * 60 + m1) * 60 + s1) * 1000 + ms1
+        end_ms = ((h2 * 60 + m2) * 60 + s2) * 1000 + ms2
         
-        if start_time_sec is None or end_time_sec is None or end_time_sec < start_time_sec:
+        if end_ms < start_ms:
             continue # Invalid times
             
-        text_lines = lines[2:]
-        if not any(line.strip() for line in text_lines): # Skip if text is empty or only whitespace
-            continue
+        text_lines = lines[block_start + 2:i] # Non-empty by construction of the block
 
-        entries.append(SRTEntry((index, start_time_sec, end_time_sec, text_lines)))
+        entries.append(SRTEntry(index, start_ms, end_ms, text_lines))
     return entries
 
 # --- Conversion Functions --- #
@@ -100,34 +87,36 @@ def convert_srt_to_lrc(srt_text: str) -> str:
     if not srt_entries:
         return ""
     
-    lrc_lines = []
+    # One write per cue into a single buffer instead of a list of line strings + final join
+    buf = io.StringIO()
+    separator = ""
     for entry in srt_entries:
         # LRC typically uses the start time of the line.
         # And text is usually single line in LRC from multi-line SRT, join with space.
-        lrc_time_tag = _format_seconds_to_lrc_timestamp(entry[1]) # entry[1] is start_time_sec
-        text_content = " ".join(line.strip() for line in entry[3]) # entry[3] is text_lines
-        lrc_lines.append(f"{lrc_time_tag}{text_content}")
+        lrc_time_tag = _format_ms_to_lrc_timestamp(entry.start_ms)
+        text_content = " ".join(line.strip() for line in entry.text_lines)
+        buf.write(f"{separator}{lrc_time_tag}{text_content}")
+        separator = "\n"
         
-    return "\n".join(lrc_lines)
+    return buf.getvalue()
 
 def convert_srt_to_vtt(srt_text: str) -> str:
     """Converts SRT formatted text to VTT format."""
     srt_entries = _parse_srt_content(srt_text)
     
-    vtt_output = ["WEBVTT", ""]
     if not srt_entries:
         return "WEBVTT\n"
 
+    buf = io.StringIO()
+    buf.write("WEBVTT\n")
     for entry in srt_entries:
-        start_time_vtt = _format_seconds_to_srt_vtt_timestamp(entry[1], 'vtt') # entry[1] is start_time_sec
-        end_time_vtt = _format_seconds_to_srt_vtt_timestamp(entry[2], 'vtt')   # entry[2] is end_time_sec
-        
-        vtt_output.append(f"{start_time_vtt} --> {end_time_vtt}")
-        for text_line in entry[3]: # entry[3] is text_lines
-            vtt_output.append(text_line.strip())
-        vtt_output.append("") # Blank line after each cue
+        start_time_vtt = _format_ms_to_srt_vtt_timestamp(entry.start_ms, 'vtt')
+        end_time_vtt = _format_ms_to_srt_vtt_timestamp(entry.end_ms, 'vtt')
+        text_block = "\n".join(line.strip() for line in entry.text_lines)
+        # Blank line before each cue (separates it from the header / previous cue), one write per cue
+        buf.write(f"\n{start_time_vtt} --> {end_time_vtt}\n{text_block}\n")
         
-    return "\n".join(vtt_output)
+    return buf.getvalue()
 
 # --- Functions to keep if direct TXT output from SRT is desired --- #
 def convert_srt_to_txt(srt_text: str) -> str:
@@ -136,12 +125,14 @@ def convert_srt_to_txt(srt_text: str) -> str:
     if not srt_entries:
         return ""
     
-    text_only_lines = []
+    buf = io.StringIO()
+    separator = ""
     for entry in srt_entries:
-        for text_line in entry[3]: # entry[3] is text_lines
-            text_only_lines.append(text_line.strip())
+        buf.write(separator)
+        buf.write("\n".join(line.strip() for line in entry.text_lines))
+        separator = "\n"
             
-    return "\n".join(text_only_lines)
+    return buf.getvalue()
 
 
 # Old LRC parsing functions are removed as they are no longer primary.
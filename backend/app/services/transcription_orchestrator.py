@@ -1,31 +1,109 @@
 # backend/app/services/transcription_orchestrator.py
+import io
+import itertools
 import os
-import tempfile
+import numpy as np
 import torch
 import torchaudio
 import re
-import math
-from typing import List, Dict, Optional, Callable, Any
-from app.transcription_providers.gemini import GeminiTranscriber
+import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Iterable, Optional, Callable, Any
+from app.core.config import settings
+from app.services.format_converter_service import _SRT_TIME_LINE_RE, _SRT_TMPL
+from app.transcription_providers.gemini import GeminiFileRegistry, GeminiTranscriber
 from app.transcription_providers.base import Transcriber as BaseTranscriber # Alias to avoid confusion
 
 # Log callback type definition (event_type: str, data: dict)
 OrchestratorLogCallbackType = Callable[[str, Dict[str, Any]], None]
 
+# torch 執行緒配置：Celery worker 預設的 intra-op 執行緒數可能很少，VAD 推論明確使用指定數量 (預設為全部核心)；
+# 不需要 inter-op 平行。set_num_interop_threads 在已有平行運算後呼叫會拋出 RuntimeError，此時沿用現有設定
+torch.set_num_threads(settings.TORCH_INTRAOP_THREADS or os.cpu_count() or 1)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass
+
 # Silero VAD setup (移植自 vad_processor.py)
 # 確保模型只載入一次
 VAD_MODEL = None
 VAD_UTILS = None
 TARGET_SAMPLE_RATE = 16000
+# Silero VAD 模型帶有內部 RNN 狀態 (推論前後皆會 reset_states)，
+# 在 threads worker pool 下多個任務共用同一模型，推論必須序列化
+_VAD_INFERENCE_LOCK = threading.Lock()
+# 載入鎖：避免多個執行緒同時進入載入流程而重複載入模型
+_VAD_LOAD_LOCK = threading.Lock()
+# VAD 推論所在裝置與精度 (載入時偵測 CUDA/MPS，無法使用時留在 CPU)
+VAD_DEVICE = torch.device("cpu")
+VAD_DTYPE = torch.float32
 
 def _load_vad_model(log_fn: OrchestratorLogCallbackType):
-    global VAD_MODEL, VAD_UTILS
-    if VAD_MODEL is not None:
+    if VAD_MODEL is not None: # 快速路徑：已載入則不取鎖
         return True
+    with _VAD_LOAD_LOCK:
+        if VAD_MODEL is not None: # 等待鎖期間可能已由其他執行緒載入
+            return True
+        return _load_vad_model_locked(log_fn)
+
+def _place_vad_model(model, log_fn: OrchestratorLogCallbackType):
+    """Moves the VAD model to CUDA (fp16, then fp32) or MPS when a test window runs there; otherwise keeps it on CPU."""
+    global VAD_DEVICE, VAD_DTYPE
+    candidates = []
+    if torch.cuda.is_available():
+        candidates = [("cuda", torch.float16), ("cuda", torch.float32)]
+    elif torch.backends.mps.is_available():
+        candidates = [("mps", torch.float32)]
+    for device, dtype in candidates:
+        try:
+            model = model.to(device=device, dtype=dtype)
+            with torch.inference_mode():
+                model.reset_states()
+                model(torch.zeros((1, VAD_WINDOW_SAMPLES), device=device, dtype=dtype), TARGET_SAMPLE_RATE)
+                model.reset_states()
+            VAD_DEVICE, VAD_DTYPE = torch.device(device), dtype
+            log_fn("log", {"message": f"VAD 模型使用裝置: {device} ({dtype})"})
+            return model
+        except Exception as e_device:
+            log_fn("warn", {"message": f"VAD 模型無法在 {device} ({dtype}) 上執行，改用其他裝置: {e_device}"})
+            model = model.to(device="cpu", dtype=torch.float32)
+    VAD_DEVICE, VAD_DTYPE = torch.device("cpu"), torch.float32
+    return model
+
+def _load_onnx_vad_model(log_fn: OrchestratorLogCallbackType):
+    """CPU path: the ONNX export of silero v5 through onnxruntime (optional dependency), or None if unavailable."""
+    try:
+        import onnxruntime
+        from importlib import resources
+        from silero_vad.utils_vad import OnnxWrapper
+    except ImportError:
+        return None
+    try:
+        model_path = str(resources.files("silero_vad.data").joinpath("silero_vad.onnx"))
+        model = OnnxWrapper(model_path, force_onnx_cpu=True)
+        # OnnxWrapper 預設單執行緒；改用與 torch 相同的 intra-op 執行緒數並開啟全部圖最佳化
+        opts = onnxruntime.SessionOptions()
+        opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = torch.get_num_threads()
+        opts.inter_op_num_threads = 1
+        model.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"], sess_options=opts)
+        log_fn("log", {"message": "VAD 在 CPU 上改用 ONNX Runtime 推論。"})
+        return model
+    except Exception as e_onnx:
+        log_fn("warn", {"message": f"載入 ONNX VAD 模型失敗，沿用 TorchScript 模型: {e_onnx}"})
+        return None
+
+def _load_vad_model_locked(log_fn: OrchestratorLogCallbackType):
+    global VAD_MODEL, VAD_UTILS
     try:
         # Try newer silero-vad pip package interface first
         from silero_vad.utils_vad import get_speech_timestamps, read_audio, load_silero_vad
-        VAD_MODEL = load_silero_vad()
+        vad_model = _place_vad_model(load_silero_vad().eval(), log_fn) # 僅推論
+        if VAD_DEVICE.type == "cpu":
+            vad_model = _load_onnx_vad_model(log_fn) or vad_model
+        VAD_MODEL = vad_model
         VAD_UTILS = {
             "get_speech_timestamps": get_speech_timestamps,
             "read_audio": read_audio
@@ -42,7 +120,7 @@ def _load_vad_model(log_fn: OrchestratorLogCallbackType):
                 onnx=False, # Ensure PyTorch model
                 trust_repo=True # Required for recent PyTorch versions
             )
-            VAD_MODEL = torch_hub_model
+            VAD_MODEL = _place_vad_model(torch_hub_model.eval(), log_fn) # 僅推論
             VAD_UTILS = {
                 "get_speech_timestamps": torch_hub_utils[0], # get_speech_timestamps
                 "read_audio": torch_hub_utils[2]            # read_audio
@@ -58,39 +136,302 @@ def _load_vad_model(log_fn: OrchestratorLogCallbackType):
     VAD_UTILS = None
     return False
 
+# Audio loading
+# 重取樣器依輸入取樣率快取 (濾波器係數只計算一次)；forward 不改變模組狀態，可跨執行緒共用
+_RESAMPLERS: Dict[int, torchaudio.transforms.Resample] = {}
+
+def _load_audio_mono_16k(input_audio_path: str) -> torch.Tensor:
+    """Loads audio as a 1D mono float tensor at TARGET_SAMPLE_RATE."""
+    wav, sample_rate = torchaudio.load(input_audio_path)
+    wav = wav.mean(dim=0) if wav.shape[0] > 1 else wav[0]
+    if sample_rate != TARGET_SAMPLE_RATE:
+        resampler = _RESAMPLERS.get(sample_rate)
+        if resampler is None:
+            resampler = _RESAMPLERS.setdefault(sample_rate, torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=TARGET_SAMPLE_RATE))
+        with torch.inference_mode():
+            wav = resampler(wav)
+    return wav
+
+# Batched Silero VAD
+# silero v5 (16 kHz) 每次輸入 512 取樣點的視窗，並為 batch 中每一列各自保留 RNN 狀態。
+# 將音訊切成數列連續的長段，各列同步前進，一次 forward 即處理多個視窗；
+# 每列需夠長，避免列首狀態重置過於頻繁而影響偵測品質。
+VAD_WINDOW_SAMPLES = 512
+VAD_MAX_BATCH_ROWS = 128
+VAD_MIN_ROW_SECONDS = 60
+
+# 能量預篩：先以每個視窗的 RMS (dB) 對照自適應噪音底，明顯靜音的視窗不送入 silero。
+# 候選視窗前後保留 hangover，讓 RNN 在語音起點前已有上下文
+VAD_ENERGY_MARGIN_DB = 10.0
+VAD_NOISE_FLOOR_ALPHA = 0.01
+VAD_ENERGY_HANGOVER_WINDOWS = 16 # ~0.5s
+
+# 分段 VAD：先只處理開頭 (第一個片段長度 + 前瞻)，讓第一個片段可先開始上傳與轉錄，
+# 其餘音訊的 VAD 與之重疊進行
+VAD_HEAD_LOOKAHEAD_SECONDS = 60
+
+def _vad_windows(wav: torch.Tensor) -> torch.Tensor:
+    """Splits a 1D waveform into (num_windows, 512); the last window is zero-padded, as silero does."""
+    num_windows = -(-wav.shape[-1] // VAD_WINDOW_SAMPLES)
+    return torch.nn.functional.pad(wav, (0, num_windows * VAD_WINDOW_SAMPLES - wav.shape[-1])).view(num_windows, VAD_WINDOW_SAMPLES)
+
+def _energy_candidate_mask(windows: torch.Tensor) -> np.ndarray:
+    """Marks windows whose energy rises above an adaptive noise floor (plus hangover) as VAD candidates."""
+    num_windows = windows.shape[0]
+    if not num_windows:
+        return np.zeros(0, dtype=bool)
+    rms_db = (20 * torch.log10(windows.square().mean(dim=1).sqrt() + 1e-9)).numpy()
+    def update_floor(noise_floor: float, level: float) -> float:
+        # 只在接近噪音底時更新 (EMA)，避免語音拉高噪音底
+        if level < noise_floor + 6.0:
+            return noise_floor + VAD_NOISE_FLOOR_ALPHA * (level - noise_floor)
+        return noise_floor
+    # 每個視窗與「納入該視窗後」的噪音底比較；第一個值為初始噪音底，略過
+    noise_floors = np.fromiter(
+        itertools.accumulate(rms_db.tolist(), update_floor, initial=float(np.percentile(rms_db, 10))),
+        dtype=np.float64, count=num_windows + 1
+    )[1:]
+    candidates = rms_db > noise_floors + VAD_ENERGY_MARGIN_DB
+    # 前後各延伸 hangover 個視窗 (膨脹)：mode='full' 的第 i + hangover 個值涵蓋 i 前後的視窗，
+    # 取中間 num_windows 個，長度與輸入相同 (mode='same' 在序列短於核心時會回傳核心長度且偏移)
+    hangover = np.ones(2 * VAD_ENERGY_HANGOVER_WINDOWS + 1, dtype=np.int32)
+    dilated = np.convolve(candidates.astype(np.int32), hangover, mode='full')
+    return dilated[VAD_ENERGY_HANGOVER_WINDOWS:VAD_ENERGY_HANGOVER_WINDOWS + num_windows] > 0
+
+def _batched_speech_probs(
+    windows: torch.Tensor,
+    model,
+    sampling_rate: int = TARGET_SAMPLE_RATE,
+    device: torch.device = torch.device("cpu"),
+    dtype: torch.dtype = torch.float32
+) -> np.ndarray:
+    """Returns the speech probability of each row of a (num_windows, 512) window tensor, treated as one stream."""
+    num_windows = windows.shape[0]
+    if not num_windows:
+        return np.zeros(0, dtype=np.float32)
+    min_row_windows = VAD_MIN_ROW_SECONDS * sampling_rate // VAD_WINDOW_SAMPLES
+    num_rows = max(1, min(VAD_MAX_BATCH_ROWS, num_windows // min_row_windows))
+    row_windows = -(-num_windows // num_rows)
+    # 補零視窗至 num_rows * row_windows 個
+    padded = torch.nn.functional.pad(windows, (0, 0, 0, num_rows * row_windows - num_windows))
+    # (rows, steps, 512) -> (steps, rows, 512)，使每一步的輸入為連續記憶體
+    # 整段一次搬到推論裝置；機率也留在裝置上，最後只同步一次
+    frames = padded.view(num_rows, row_windows, VAD_WINDOW_SAMPLES).transpose(0, 1).contiguous().to(device=device, dtype=dtype)
+    probs = torch.empty((row_windows, num_rows), dtype=torch.float32, device=device)
+    model.reset_states()
+    for step in range(row_windows):
+        probs[step] = model(frames[step], sampling_rate).view(-1)
+    model.reset_states()
+    return probs.t().reshape(-1)[:num_windows].cpu().numpy()
+
+def _speech_probs(
+    windows: torch.Tensor,
+    candidate_mask: Optional[np.ndarray],
+    model,
+    device: torch.device = torch.device("cpu"),
+    dtype: torch.dtype = torch.float32
+) -> tuple[np.ndarray, int]:
+    """Per-window speech probabilities of (num_windows, 512) windows and the number of windows actually run through the model.
+
+    With a candidate_mask (energy prefilter) only the candidate windows are run; the rest get probability 0.
+    """
+    if candidate_mask is None:
+        return _batched_speech_probs(windows, model, device=device, dtype=dtype), windows.shape[0]
+    # 只把候選視窗串接成一條連續序列送入模型，其餘視窗機率為 0
+    probs = np.zeros(windows.shape[0], dtype=np.float32)
+    num_candidates = int(candidate_mask.sum())
+    if num_candidates:
+        probs[candidate_mask] = _batched_speech_probs(windows[torch.from_numpy(candidate_mask)], model, device=device, dtype=dtype)
+    return probs, num_candidates
+
+def _speech_segments_from_probs(
+    probs: np.ndarray,
+    num_samples: int,
+    sampling_rate: int = TARGET_SAMPLE_RATE,
+    threshold: float = 0.5,
+    min_speech_duration_ms: int = 250,
+    min_silence_duration_ms: int = 100,
+    speech_pad_ms: int = 30
+) -> tuple[np.ndarray, np.ndarray]:
+    """Port of silero get_speech_timestamps' onset/offset logic (no max speech duration); returns (starts, ends) in samples."""
+    neg_threshold = max(threshold - 0.15, 0.01)
+    min_speech_samples = sampling_rate * min_speech_duration_ms / 1000
+    min_silence_samples = sampling_rate * min_silence_duration_ms / 1000
+    speech_pad_samples = sampling_rate * speech_pad_ms // 1000
+
+    starts: List[int] = []
+    ends: List[int] = []
+    triggered = False
+    speech_start = temp_end = 0
+    for i, speech_prob in enumerate(probs.tolist()):
+        if speech_prob >= threshold:
+            temp_end = 0
+            if not triggered:
+                triggered = True
+                speech_start = VAD_WINDOW_SAMPLES * i
+            continue
+        if speech_prob < neg_threshold and triggered:
+            if not temp_end:
+                temp_end = VAD_WINDOW_SAMPLES * i
+            if VAD_WINDOW_SAMPLES * i - temp_end < min_silence_samples:
+                continue
+            if temp_end - speech_start > min_speech_samples:
+                starts.append(speech_start)
+                ends.append(temp_end)
+            triggered = False
+            temp_end = 0
+    if triggered and num_samples - speech_start > min_speech_samples:
+        starts.append(speech_start)
+        ends.append(num_samples)
+
+    starts_samp = np.array(starts, dtype=np.int64)
+    ends_samp = np.array(ends, dtype=np.int64)
+    if not starts:
+        return starts_samp, ends_samp
+    # 邊界補白：相鄰片段間靜音不足 2*pad 時各分一半，否則各自補 pad
+    silence = starts_samp[1:] - ends_samp[:-1]
+    pad = np.where(silence < 2 * speech_pad_samples, silence // 2, speech_pad_samples)
+    starts_samp[1:] -= pad
+    ends_samp[:-1] += pad
+    starts_samp[0] -= speech_pad_samples
+    ends_samp[-1] += speech_pad_samples
+    np.clip(starts_samp, 0, None, out=starts_samp)
+    np.clip(ends_samp, None, num_samples, out=ends_samp)
+    return starts_samp, ends_samp
+
+# 16-bit PCM mono WAV header (44 bytes): RIFF/WAVE + fmt chunk + data chunk header
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+def _pcm16_wav_header(num_samples: int, sample_rate: int) -> bytes:
+    data_size = num_samples * 2
+    return _WAV_HEADER.pack(
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16, # PCM, mono, byte rate, block align, bits
+        b'data', data_size
+    )
+
 # Helper functions for SRT
-def _format_seconds_to_srt_timestamp(seconds: float) -> str:
-    if seconds < 0: seconds = 0
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int(round((seconds - int(seconds)) * 1000))
-    if millis >= 1000: # Handle rounding
-        millis = 0
-        secs += 1
-        if secs >= 60:
-            secs = 0
-            minutes += 1
-            if minutes >= 60:
-                minutes = 0
-                hours += 1
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-
-def _parse_srt_time_to_seconds(time_str: str) -> Optional[float]:
-    match = re.match(r'(\d{2}):(\d{2}):(\d{2}),(\d{3})', time_str)
-    if match:
-        h, m, s, ms = map(int, match.groups())
-        return h * 3600 + m * 60 + s + ms / 1000.0
-    return None
+_SRT_BLOCK_SPLIT_RE = re.compile(r'\n\s*\n')
+
+def _shift_srt_timestamp(h: str, m: str, s: str, ms: str, offset_ms: int) -> str:
+    # 以整數毫秒運算，避免跨片段累積浮點誤差
+    total_ms = max(0, ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms) + offset_ms)
+    secs, millis = divmod(total_ms, 1000)
+    minutes, secs = divmod(secs, 60)
+    hours, minutes = divmod(minutes, 60)
+    return _SRT_TMPL(hours, minutes, secs, millis)
 
 def _adjust_srt_timestamps_and_reindex(srt_content: Optional[str], offset_seconds: float, start_index: int) -> tuple[str, int]:
 
     if not isinstance(srt_content, str):
         return srt_content or "", start_index
 
+    offset_ms = int(offset_seconds * 1000 + 0.5) # 偏移量非負，直接加 0.5 取整
+
     current_index = start_index
-       
-    return srt_content, current_index
+    adjusted_blocks: List[str] = []
+    for block in _SRT_BLOCK_SPLIT_RE.split(srt_content.replace('\r\n', '\n').strip()):
+        lines = [line for line in block.split('\n') if not line.startswith('```')] # 去除模型回應中的 ``` 標記行
+        # 時間軸通常在第 2 行；模型偶爾省略序號行，因此取第一個符合的行。
+        # 先以 "-->" 子字串篩選，序號行與文字行不必進入正規表示式
+        for time_line_idx, line in enumerate(lines[:2]):
+            match = _SRT_TIME_LINE_RE.search(line) if '-->' in line else None
+            if match:
+                break
+        else:
+            continue # 非字幕區塊 (如說明文字)，略過
+        time_line = lines[time_line_idx]
+        if offset_ms:
+            # 直接沿用搜尋到的 match 改寫時間軸，不再對同一行重新掃描 (第一個片段偏移為 0，原樣保留)
+            g = match.groups()
+            time_line = f"{time_line[:match.start()]}{_shift_srt_timestamp(*g[:4], offset_ms)} --> {_shift_srt_timestamp(*g[4:], offset_ms)}{time_line[match.end():]}"
+        adjusted_blocks.append("\n".join([str(current_index), time_line, *lines[time_line_idx + 1:]]))
+        current_index += 1
+
+    return "\n\n".join(adjusted_blocks), current_index
+
+def _shift_srt_stream(text_pieces: Iterable[str], offset_ms: int, out: io.StringIO) -> None:
+    """Shifts SRT time lines by offset_ms while the text streams in, writing complete lines to out.
+
+    Same rules as _adjust_srt_timestamps_and_reindex (``` lines dropped, time line among the first
+    two lines of a block), so the collected result only needs renumbering.
+    """
+    pending = ""
+    line_in_block = 0 # 目前區塊中已寫出的行數 (空白行代表區塊結束)
+
+    def write_line(line: str) -> None:
+        nonlocal line_in_block
+        line = line.rstrip('\r')
+        if line.startswith('```'):
+            return
+        if not line.strip():
+            line_in_block = 0
+            out.write('\n')
+            return
+        # 只有區塊前兩行且含 "-->" 的行才跑正規表示式
+        if offset_ms and line_in_block < 2 and '-->' in line:
+            match = _SRT_TIME_LINE_RE.search(line)
+            if match:
+                g = match.groups()
+                line = f"{line[:match.start()]}{_shift_srt_timestamp(*g[:4], offset_ms)} --> {_shift_srt_timestamp(*g[4:], offset_ms)}{line[match.end():]}"
+        line_in_block += 1
+        out.write(line)
+        out.write('\n')
+
+    for piece in text_pieces:
+        # 串流片段可能在行中間斷開：只處理完整的行，剩餘部分留待下一段
+        lines = (pending + piece).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            write_line(line)
+    if pending:
+        write_line(pending)
+
+
+def _reliable_gap_mids(starts_samp: np.ndarray, ends_samp: np.ndarray, num_samples: int, min_gap_samples: int, max_gap_end: Optional[int] = None) -> np.ndarray:
+    """Middles (in samples, increasing) of the silence gaps around speech segments lasting at least min_gap_samples.
+
+    Gaps ending after max_gap_end are left out.
+    """
+    # 第 i 個間隔為 [此前語音的最晚結束點, 第 i 段語音開始]，最後再加上 [最晚結束點, 結尾]
+    gap_starts = np.concatenate(([0], np.maximum.accumulate(ends_samp)))
+    gap_ends = np.concatenate((starts_samp, [num_samples]))
+    gap_durations = gap_ends - gap_starts
+    reliable_mask = (gap_durations > 0) & (gap_durations >= min_gap_samples)
+    if max_gap_end is not None:
+        reliable_mask &= gap_ends <= max_gap_end
+    return (gap_starts[reliable_mask] + gap_ends[reliable_mask]) // 2
+
+def _plan_chunk_boundaries(
+    gap_mids_samp: np.ndarray,
+    duration_samples: int,
+    target_seg_samples: int,
+    min_split_lead_samples: int,
+    boundaries: Optional[List[int]] = None,
+    final: bool = True
+) -> List[int]:
+    """Returns chunk boundaries in samples: [0, split_1, ..., duration_samples].
+
+    With final=False, gap_mids_samp only covers the start of the file: the split points it
+    already decides are appended (without the end of file) and a later call continues the list.
+    """
+    boundaries = [0] if boundaries is None else boundaries
+    num_gaps = len(gap_mids_samp)
+    while boundaries[-1] + target_seg_samples < duration_samples:
+        current_start_samp = boundaries[-1]
+        # Split at the first reliable silence gap middle at/after the ideal end that is also
+        # significantly after the current start (ensure meaningful segment).
+        # 中點已遞增排序，兩個條件各以二分搜尋找出第一個符合的位置，取較大者即可
+        gap_idx = max(
+            int(np.searchsorted(gap_mids_samp, current_start_samp + target_seg_samples, side='left')),
+            int(np.searchsorted(gap_mids_samp, current_start_samp + min_split_lead_samples, side='right'))
+        )
+        if gap_idx >= num_gaps:
+            break # No suitable silence after the ideal end: the last chunk extends to end of file (or wait for more gaps)
+        boundaries.append(int(gap_mids_samp[gap_idx]))
+    if final:
+        boundaries.append(duration_samples)
+    return boundaries
 
 
 class TranscriptionOrchestrator:
@@ -100,6 +441,8 @@ class TranscriptionOrchestrator:
         self.prompt = prompt
         self._log_callback = log_callback
         self.transcriber: Optional[BaseTranscriber] = None # Use the alias
+        # 逐片段的細節記錄僅在除錯模式下產生，避免熱路徑上格式化大量訊息
+        self._debug_enabled = settings.ORCHESTRATOR_DEBUG
 
         if not _load_vad_model(self._log_callback):
             raise RuntimeError("VAD 模型無法載入，無法進行轉錄編排。")
@@ -108,34 +451,64 @@ class TranscriptionOrchestrator:
             self.transcriber = GeminiTranscriber(
                 api_key=self.api_key,
                 model_name=self.model_name,
-                log_callback=self._log_callback # Pass down the log callback
+                log_callback=self._log_callback, # Pass down the log callback
+                file_registry=GeminiFileRegistry(settings.GEMINI_FILE_REGISTRY_PATH) if settings.GEMINI_FILE_REUSE else None,
+                prompt_cache_min_tokens=settings.GEMINI_PROMPT_CACHE_MIN_TOKENS
             )
         except Exception as e:
             self._log_callback("error", {"message": f"初始化 GeminiTranscriber 失敗: {e}"})
             raise # Re-raise to be caught by Celery task
 
 
-    def _save_chunk_to_temp_file(self, audio_chunk_tensor: torch.Tensor, sample_rate: int) -> Optional[str]:
-        """Saves audio chunk to a temporary WAV file and returns its path."""
-        temp_file = None
+    def _chunk_to_wav_bytes(self, audio_chunk_i16: np.ndarray, sample_rate: int) -> Optional[bytes]:
+        """Encodes a 1D int16 audio chunk as a 16-bit PCM WAV in memory and returns the bytes."""
         try:
-            # Ensure tensor is 2D (channels, samples) and on CPU
-            if audio_chunk_tensor.ndim == 1:
-                audio_chunk_tensor = audio_chunk_tensor.unsqueeze(0)
-            audio_chunk_tensor = audio_chunk_tensor.cpu()
-
-            # Create a temporary file
-            fd, temp_filepath = tempfile.mkstemp(suffix=".wav", prefix="audio_chunk_")
-            os.close(fd) # Close the file descriptor, torchaudio.save will open it
-
-            torchaudio.save(temp_filepath, audio_chunk_tensor, sample_rate)
-            self._log_callback("log", {"message": f"音訊片段已儲存至暫存檔: {temp_filepath}"})
-            return temp_filepath
+            # 標頭與 PCM 取樣 (連續 view 的 buffer，不先轉成 bytes) 一次串接：只配置一份最終大小的 bytes
+            return b"".join((_pcm16_wav_header(len(audio_chunk_i16), sample_rate), audio_chunk_i16.data))
         except Exception as e:
-            self._log_callback("error", {"message": f"儲存音訊片段至暫存檔失敗: {e}"})
-            if temp_filepath and os.path.exists(temp_filepath):
-                os.remove(temp_filepath)
+            self._log_callback("error", {"message": f"音訊片段 WAV 編碼失敗: {e}"})
+            return None
+
+
+    def _transcribe_chunk(self, chunk_index: int, audio_chunk: np.ndarray, offset_ms: int) -> Optional[str]:
+        """Encodes, uploads and transcribes one chunk; runs on the chunk thread pool.
+
+        Returns the chunk's SRT already shifted by offset_ms (cue numbers are assigned by the caller).
+        """
+        # --- 在記憶體中編碼片段 ---
+        chunk_wav_bytes = self._chunk_to_wav_bytes(audio_chunk, TARGET_SAMPLE_RATE)
+        if chunk_wav_bytes is None:
+            # Error already logged by _chunk_to_wav_bytes
+            self._log_callback("error", {"message": f"片段 {chunk_index} 編碼失敗，跳過此片段的轉錄。"})
+            return None
+
+        # --- 上傳並轉錄片段 ---
+        chunk_display_name = f"audio_chunk_{chunk_index:04d}.wav"
+        if self._debug_enabled:
+            self._log_callback("log", {"message": f"片段 {chunk_index}: 開始上傳和轉錄 {chunk_display_name}..."})
+        uploaded_file_obj = self.transcriber.upload_file_from_bytes(
+            chunk_wav_bytes, mime_type="audio/wav", display_name=chunk_display_name
+        )
+        del chunk_wav_bytes # 上傳完成即釋放
+        if not uploaded_file_obj:
+            self._log_callback("warn", {"message": f"片段 {chunk_index} 上傳失敗。"})
+            return None
+
+        # 邊接收串流回應邊偏移時間軸，寫入此片段自己的緩衝區
+        chunk_buf = io.StringIO()
+        try:
+            _shift_srt_stream(self.transcriber.transcribe_file_streaming(uploaded_file_obj, self.prompt), offset_ms, chunk_buf)
+        except Exception as e_stream:
+            # 錯誤已由 transcriber 記錄；不完整的結果直接捨棄
+            self._log_callback("warn", {"message": f"片段 {chunk_index} 轉錄中斷: {e_stream}"})
             return None
+        chunk_transcription_srt = chunk_buf.getvalue()
+        if chunk_transcription_srt.strip():
+            if self._debug_enabled:
+                self._log_callback("log", {"message": f"片段 {chunk_index}: 收到轉錄結果，長度 {len(chunk_transcription_srt)}。"})
+            return chunk_transcription_srt
+        self._log_callback("warn", {"message": f"片段 {chunk_index} 轉錄失敗或無內容。"})
+        return None
 
 
     def process_audio(
@@ -146,190 +519,159 @@ class TranscriptionOrchestrator:
         vad_internal_min_silence_ms: int = 1000,
         speech_pad_ms: int = 50
     ) -> Optional[str]:
-        print(f"input_audio_path: {input_audio_path}")
         if VAD_MODEL is None or VAD_UTILS is None or self.transcriber is None:
             self._log_callback("error", {"message": "VAD 或轉錄器未初始化，無法處理。"})
             return None
         if not os.path.exists(input_audio_path):
             self._log_callback("error", {"message": f"找不到輸入音檔: {input_audio_path}"})
             return None
-        print(f"AAAAA")
+        self._log_callback("log", {"message": f"開始處理音檔: {input_audio_path}"})
         self._log_callback("progress", {"percentage": 5, "step_message": "載入音訊並進行 VAD..."})
 
-        temp_chunk_files_to_clean = []
-        all_transcriptions_srt_blocks: List[str] = []
+        # 各片段調整後的 SRT 依序直接寫入同一緩衝區，最後不需再 join
+        srt_out_buf = io.StringIO()
         current_srt_master_index = 1
-        print(f"BBBBB")
+        # 上傳與轉錄為網路 I/O，交給執行緒池並行處理；主迴圈繼續切割下一個片段
+        chunk_pool = ThreadPoolExecutor(max_workers=max(1, settings.MORTIS_CHUNK_CONCURRENCY), thread_name_prefix="chunk_transcribe")
+        chunk_futures: List[tuple[int, Future]] = [] # (chunk_index, future)，依片段順序
         try:
             # --- 1. 載入音訊和 VAD 偵測 ---
-            read_audio_fn = VAD_UTILS["read_audio"]
-            get_speech_timestamps_fn = VAD_UTILS["get_speech_timestamps"]
-            print(f"CCCCC")
-            wav_tensor = read_audio_fn(input_audio_path, sampling_rate=TARGET_SAMPLE_RATE)
-            duration_seconds = wav_tensor.shape[-1] / TARGET_SAMPLE_RATE
+            try:
+                wav_tensor = _load_audio_mono_16k(input_audio_path)
+            except Exception as e_load_audio:
+                # torchaudio 無可用後端解碼此格式時，退回 silero 的 read_audio
+                self._log_callback("warn", {"message": f"torchaudio 載入音檔失敗，改用 silero read_audio: {e_load_audio}"})
+                wav_tensor = VAD_UTILS["read_audio"](input_audio_path, sampling_rate=TARGET_SAMPLE_RATE)
+                if wav_tensor.ndim == 2:
+                    wav_tensor = wav_tensor[0] if wav_tensor.shape[0] == 1 else wav_tensor.mean(dim=0)
+            # 統一為連續的 1D 單聲道張量
+            wav_tensor = wav_tensor.contiguous()
+            duration_samples = wav_tensor.shape[-1]
+            duration_seconds = duration_samples / TARGET_SAMPLE_RATE
             self._log_callback("log", {"message": f"已載入音檔: {input_audio_path}, 時長: {duration_seconds:.2f}s"})
-            print(f"DDDDD")
-            speech_timestamps: List[Dict[str, int]] = get_speech_timestamps_fn(
-                wav_tensor, VAD_MODEL, sampling_rate=TARGET_SAMPLE_RATE,
-                min_speech_duration_ms=250,
-                min_silence_duration_ms=vad_internal_min_silence_ms,
-                speech_pad_ms=speech_pad_ms
-            )
-            print(f"EEEEE")
-            # Convert sample-based timestamps to seconds
-            speech_timestamps_sec: List[Dict[str, float]] = []
-            if speech_timestamps and 'start' in speech_timestamps[0] and isinstance(speech_timestamps[0]['start'], int):
-                 speech_timestamps_sec = [{'start': ts['start'] / TARGET_SAMPLE_RATE, 'end': ts['end'] / TARGET_SAMPLE_RATE} for ts in speech_timestamps]
-            elif speech_timestamps and 'start' in speech_timestamps[0]: # If already in seconds (less likely from silero directly)
-                 speech_timestamps_sec = speech_timestamps
-            else: # No speech detected by VAD
-                 speech_timestamps_sec = []
-            print(f"FFFFF")
-
-            self._log_callback("log", {"message": f"VAD 找到 {len(speech_timestamps_sec)} 個（可能重疊的）語音片段。"})
-            if not speech_timestamps_sec:
-                self._log_callback("warn", {"message": "音檔中未偵測到語音。將嘗試轉錄整個檔案作為單一片段。"})
-                # Treat the whole file as one speech segment
-                speech_timestamps_sec = [{'start': 0.0, 'end': duration_seconds}]
-
-            print(f"GGGGG")
-            # --- 2. 計算可靠的靜音間隔 (用於切割點) ---
-            min_reliable_silence_sec = min_reliable_silence_ms / 1000.0
-            reliable_silence_gaps: List[Dict[str, float]] = [] # {'start', 'end', 'mid'}
-            last_speech_end = 0.0
-            for ts_idx, segment in enumerate(speech_timestamps_sec):
-                gap_start = last_speech_end
-                gap_end = segment['start']
-                if gap_end > gap_start: # There is a silence
-                    silence_duration = gap_end - gap_start
-                    if silence_duration >= min_reliable_silence_sec:
-                        reliable_silence_gaps.append({'start': gap_start, 'end': gap_end, 'mid': (gap_start + gap_end) / 2})
-                last_speech_end = max(last_speech_end, segment['end'])
-            # Check for silence after the last speech segment until file end
-            if duration_seconds > last_speech_end:
-                final_silence_duration = duration_seconds - last_speech_end
-                if final_silence_duration >= min_reliable_silence_sec:
-                    reliable_silence_gaps.append({'start': last_speech_end, 'end': duration_seconds, 'mid': (last_speech_end + duration_seconds) / 2})
-            self._log_callback("log", {"message": f"找到 {len(reliable_silence_gaps)} 個可靠的靜音間隔 (>= {min_reliable_silence_sec:.2f}s)。"})
-            print(f"HHHHH")
-
-            # --- 3. 迭代處理片段並轉錄 ---
-            current_segment_start_time = 0.0
-            target_segment_duration_seconds = segment_duration_minutes * 60.0
-            chunk_index = 0
-            total_chunks_estimate = max(1, math.ceil(duration_seconds / target_segment_duration_seconds)) # Rough estimate for progress
-            print(f"IIIII")
-            while current_segment_start_time < duration_seconds:
-                chunk_index += 1
+            # 整段音訊只轉換一次為 int16 PCM 的 NumPy 陣列 (wav_tensor 在 CPU 上，.numpy() 不複製)，
+            # 各片段直接以 NumPy view 切割編碼，不經 torch dispatch
+            wav_i16 = (wav_tensor * 32767).clamp_(-32768, 32767).to(torch.int16).numpy()
+
+            # --- 2. 分段 VAD，並在切割點確定後立即提交片段轉錄 ---
+            # 全程以整數取樣點運算，僅在記錄與時間戳偏移時換算成秒
+            target_seg_samples = max(1, int(segment_duration_minutes * 60 * TARGET_SAMPLE_RATE))
+            min_reliable_silence_samples = min_reliable_silence_ms * TARGET_SAMPLE_RATE // 1000
+            vad_windows = _vad_windows(wav_tensor)
+            del wav_tensor # 之後只用 VAD 視窗 (補零後的副本) 與 int16 版本
+            num_windows = vad_windows.shape[0]
+            candidate_mask = _energy_candidate_mask(vad_windows) if settings.VAD_ENERGY_PREFILTER else None
+            speech_probs = np.zeros(num_windows, dtype=np.float32)
+            num_vad_windows = 0
+            # 先處理開頭 (第一個片段 + 前瞻)，其餘一次處理；前段確定的片段在後段 VAD 進行時即開始上傳轉錄
+            head_windows = (target_seg_samples + VAD_HEAD_LOOKAHEAD_SECONDS * TARGET_SAMPLE_RATE) // VAD_WINDOW_SAMPLES
+            stripe_ends = [head_windows, num_windows] if head_windows < num_windows else [num_windows]
+            # 只分析到前段結尾時，最後一段語音可能尚未結束 (或之後因過短被捨棄)；
+            # 結束於此範圍之前的靜音間隔在完整分析中不會改變
+            unsettled_tail_samples = (vad_internal_min_silence_ms + 250) * TARGET_SAMPLE_RATE // 1000 + 2 * VAD_WINDOW_SAMPLES
+            chunk_boundaries: List[int] = [0]
+            stripe_start = 0
+            for stripe_end in stripe_ends:
+                # inference_mode: 不建立 autograd 記錄，降低 VAD 推論的記憶體與 dispatch 開銷
+                with _VAD_INFERENCE_LOCK, torch.inference_mode():
+                    # 視窗本身留在 CPU
+                    stripe_probs, stripe_windows_run = _speech_probs(
+                        vad_windows[stripe_start:stripe_end],
+                        None if candidate_mask is None else candidate_mask[stripe_start:stripe_end],
+                        VAD_MODEL, device=VAD_DEVICE, dtype=VAD_DTYPE
+                    )
+                speech_probs[stripe_start:stripe_end] = stripe_probs
+                num_vad_windows += stripe_windows_run
+                stripe_start = stripe_end
+                vad_done = stripe_end == num_windows
+                analyzed_samples = duration_samples if vad_done else stripe_end * VAD_WINDOW_SAMPLES
+
+                # 語音片段為取樣點整數陣列，後續以向量化方式計算靜音間隔
+                starts_samp, ends_samp = _speech_segments_from_probs(
+                    speech_probs[:stripe_end], analyzed_samples,
+                    min_speech_duration_ms=250,
+                    min_silence_duration_ms=vad_internal_min_silence_ms,
+                    speech_pad_ms=speech_pad_ms
+                )
+                if vad_done:
+                    # VAD 完成，float 視窗不再需要，立即釋放
+                    del vad_windows
+                    if num_vad_windows < num_windows:
+                        self._log_callback("log", {"message": f"能量預篩略過 {num_windows - num_vad_windows}/{num_windows} 個靜音視窗。"})
+                    num_speech_segments = len(starts_samp)
+                    self._log_callback("log", {"message": f"VAD 找到 {num_speech_segments} 個（可能重疊的）語音片段。"})
+                    if not num_speech_segments:
+                        self._log_callback("warn", {"message": "音檔中未偵測到語音。將嘗試轉錄整個檔案作為單一片段。"})
+                        # Treat the whole file as one speech segment
+                        starts_samp = np.zeros(1, dtype=np.int64)
+                        ends_samp = np.array([duration_samples], dtype=np.int64)
+
+                # --- 計算可靠的靜音間隔 (用於切割點) ---
+                reliable_gap_mids_samp = _reliable_gap_mids(
+                    starts_samp, ends_samp, analyzed_samples, min_reliable_silence_samples,
+                    max_gap_end=None if vad_done else analyzed_samples - unsettled_tail_samples
+                )
+                if vad_done:
+                    self._log_callback("log", {"message": f"找到 {len(reliable_gap_mids_samp)} 個可靠的靜音間隔 (>= {min_reliable_silence_ms / 1000.0:.2f}s)。"})
+
+                # --- 3. 規劃切割點並提交各片段轉錄 ---
+                chunk_boundaries = _plan_chunk_boundaries(
+                    reliable_gap_mids_samp,
+                    duration_samples,
+                    target_seg_samples=target_seg_samples,
+                    min_split_lead_samples=TARGET_SAMPLE_RATE, # 切割點至少在片段開始 1 秒之後
+                    boundaries=chunk_boundaries,
+                    final=vad_done
+                )
+                total_chunks = len(chunk_boundaries) - 1
+                if vad_done:
+                    self._log_callback("log", {"message": f"音檔將切割為 {total_chunks} 個片段。"})
+                for chunk_index in range(len(chunk_futures) + 1, total_chunks + 1):
+                    start_samp, end_samp = chunk_boundaries[chunk_index - 1], chunk_boundaries[chunk_index]
+                    self._log_callback("progress", {
+                        "percentage": int(10 + 80 * (start_samp / duration_samples)), # 10% to 90% for this loop
+                        "step_message": f"處理音訊片段 {chunk_index}/{total_chunks}..." if vad_done else f"處理音訊片段 {chunk_index}..."
+                    })
+                    audio_chunk = wav_i16[start_samp:end_samp] # 連續 NumPy view，不複製
+
+                    if self._debug_enabled:
+                        self._log_callback("log", {"message": f"片段 {chunk_index}: 時間 [{start_samp / TARGET_SAMPLE_RATE:.2f}s - {end_samp / TARGET_SAMPLE_RATE:.2f}s], 取樣點 [{start_samp} - {end_samp}]"})
+
+                    # 偏移量換算為整數毫秒 (四捨五入)，由片段執行緒在接收結果時直接套用
+                    chunk_offset_ms = (start_samp * 1000 + TARGET_SAMPLE_RATE // 2) // TARGET_SAMPLE_RATE
+                    chunk_futures.append((
+                        chunk_index,
+                        chunk_pool.submit(self._transcribe_chunk, chunk_index, audio_chunk, chunk_offset_ms)
+                    ))
+
+            # --- 依原順序收集結果並重新編號 (時間戳已在片段執行緒中偏移) ---
+            for chunk_index, chunk_future in chunk_futures:
+                chunk_transcription_srt = chunk_future.result()
                 self._log_callback("progress", {
-                    "percentage": int(10 + 80 * (current_segment_start_time / duration_seconds)), # 10% to 90% for this loop
-                    "step_message": f"處理音訊片段 {chunk_index}/{total_chunks_estimate}..."
+                    "percentage": int(10 + 80 * (chunk_index / len(chunk_futures))),
+                    "step_message": f"片段 {chunk_index}/{len(chunk_futures)} 轉錄完成..."
                 })
-                print(f"JJJJJ")
-                # --- 確定此片段的結束時間 (切割點) ---
-                # Target end time for this segment based on desired duration
-                ideal_segment_end_time = current_segment_start_time + target_segment_duration_seconds
-                actual_segment_end_time = duration_seconds # Default to end of file
-                print(f"KKKKK")
-                if ideal_segment_end_time < duration_seconds: # If not the last potential segment
-                    # Find the first reliable silence gap *after* the ideal_segment_end_time
-                    # and use its middle as the split point.
-                    found_split_point = False
-                    for gap in reliable_silence_gaps:
-                        # Gap middle should be after ideal end, and also significantly after current start
-                        if gap['mid'] >= ideal_segment_end_time and gap['mid'] > (current_segment_start_time + 1.0): # Ensure meaningful segment
-                            actual_segment_end_time = gap['mid']
-                            found_split_point = True
-                            self._log_callback("log", {"message": f"片段 {chunk_index}: 目標切割時間 {ideal_segment_end_time:.2f}s, 找到靜音中點 {actual_segment_end_time:.2f}s 作為切割點。"})
-                            break
-                    if not found_split_point:
-                        # If no suitable silence found after ideal time, extend to end of file for this chunk,
-                        # or if the ideal end time is already very close to duration_seconds.
-                        actual_segment_end_time = duration_seconds
-                        self._log_callback("log", {"message": f"片段 {chunk_index}: 未找到理想靜音切割點，延伸至檔案結尾 {actual_segment_end_time:.2f}s。"})
-                    # Ensure we don't create zero-length or tiny segments if actual_segment_end_time is too close or before current_start
-                    if actual_segment_end_time <= current_segment_start_time + 0.1: # Min 100ms segment
-                        actual_segment_end_time = current_segment_start_time + 0.1
-                        if actual_segment_end_time > duration_seconds: # Cap at file end
-                            actual_segment_end_time = duration_seconds
-                        self._log_callback("warn", {"message": f"片段 {chunk_index}: 切割點過近，調整片段結束時間至 {actual_segment_end_time:.2f}s"})
-                else: # This is the last segment
-                     actual_segment_end_time = duration_seconds
-                     self._log_callback("log", {"message": f"片段 {chunk_index}: 處理最後的音訊片段至檔案末尾 ({actual_segment_end_time:.2f}s)。"})
-
-
-                # --- 提取音訊片段張量 ---
-                start_sample = int(current_segment_start_time * TARGET_SAMPLE_RATE)
-                end_sample = int(actual_segment_end_time * TARGET_SAMPLE_RATE)
-                # Ensure end_sample does not exceed tensor length
-                end_sample = min(end_sample, wav_tensor.shape[-1])
-
-                if start_sample >= end_sample : # Should not happen if logic is correct
-                    self._log_callback("warn", {"message": f"片段 {chunk_index}: 起始取樣點 ({start_sample}) >= 結束取樣點 ({end_sample})，跳過此空片段。"})
-                    current_segment_start_time = actual_segment_end_time
-                    if current_segment_start_time >= duration_seconds and start_sample == end_sample : # If at the very end and no more data
-                        break
+                if not chunk_transcription_srt:
                     continue
-
-                # MODIFIED: Handle 1D (mono) or 2D (stereo/multi-channel) tensors
-                if wav_tensor.ndim == 1:
-                    audio_chunk = wav_tensor[start_sample:end_sample]
-                elif wav_tensor.ndim == 2:
-                    audio_chunk = wav_tensor[:, start_sample:end_sample]
-
-
-                self._log_callback("log", {"message": f"片段 {chunk_index}: 時間 [{current_segment_start_time:.2f}s - {actual_segment_end_time:.2f}s], 取樣點 [{start_sample} - {end_sample}]"})
-
-                # --- 儲存片段到暫存檔 ---
-                temp_chunk_file_path = self._save_chunk_to_temp_file(audio_chunk, TARGET_SAMPLE_RATE)
-                if not temp_chunk_file_path:
-                    # Error already logged by _save_chunk_to_temp_file
-                    # Decide if we should stop or try to continue
-                    self._log_callback("error", {"message": f"片段 {chunk_index} 儲存失敗，跳過此片段的轉錄。"})
-                    current_segment_start_time = actual_segment_end_time
-                    continue # Move to next segment
-                temp_chunk_files_to_clean.append(temp_chunk_file_path)
-
-
-                # --- 上傳並轉錄片段 ---
-                self._log_callback("log", {"message": f"片段 {chunk_index}: 開始上傳和轉錄 {os.path.basename(temp_chunk_file_path)}..."})
-                uploaded_file_obj = self.transcriber.upload_file(temp_chunk_file_path)
-                if uploaded_file_obj:
-                    chunk_transcription_srt = self.transcriber.transcribe_file(
-                        uploaded_file_obj, self.prompt
-                    )
-
-                    if chunk_transcription_srt and isinstance(chunk_transcription_srt, str) and chunk_transcription_srt.strip():
-                        self._log_callback("log", {"message": f"片段 {chunk_index}: 收到轉錄結果，長度 {len(chunk_transcription_srt)}。正在調整時間戳並重新編號..."})
-
-
-                        adjusted_srt_chunk, next_master_index = _adjust_srt_timestamps_and_reindex(
-                            srt_content=chunk_transcription_srt,
-                            offset_seconds=current_segment_start_time,
-                            start_index=current_srt_master_index
-                        )
-
-                        if adjusted_srt_chunk.strip(): # Only add if there's content after adjustment
-                            all_transcriptions_srt_blocks.append(adjusted_srt_chunk)
-                            current_srt_master_index = next_master_index
-                        else:
-                            self._log_callback("log", {"message": f"片段 {chunk_index}: 轉錄結果調整後為空，可能無有效字幕內容。"})
-                    else:
-                        self._log_callback("warn", {"message": f"片段 {chunk_index} 轉錄失敗或無內容。"})
+                adjusted_srt_chunk, next_master_index = _adjust_srt_timestamps_and_reindex(
+                    srt_content=chunk_transcription_srt,
+                    offset_seconds=0.0,
+                    start_index=current_srt_master_index
+                )
+
+                if adjusted_srt_chunk.strip(): # Only add if there's content after adjustment
+                    if srt_out_buf.tell():
+                        srt_out_buf.write("\n\n")
+                    srt_out_buf.write(adjusted_srt_chunk)
+                    current_srt_master_index = next_master_index
                 else:
-                    self._log_callback("warn", {"message": f"片段 {chunk_index} 上傳失敗。"})
-
-
-                # 更新下一個片段的開始時間
-                current_segment_start_time = actual_segment_end_time
+                    self._log_callback("log", {"message": f"片段 {chunk_index}: 轉錄結果調整後為空，可能無有效字幕內容。"})
 
             # --- 4. 合併所有轉錄結果 ---
-            final_transcription_content = ""
-            if all_transcriptions_srt_blocks:
-                final_transcription_content = "\\n\\n".join(all_transcriptions_srt_blocks).strip()
-                # Ensure a blank line at the end if there's content, some players prefer it.
-                # However, most parsers handle it fine without. For consistency, let's ensure it's clean.
-                # final_transcription_content += "\\n" 
+            final_transcription_content = srt_out_buf.getvalue().strip()
+            # Ensure a blank line at the end if there's content, some players prefer it.
+            # However, most parsers handle it fine without. For consistency, let's ensure it's clean.
+            # final_transcription_content += "\n" 
 
             self._log_callback("progress", {"percentage": 95, "step_message": "轉錄完成，正在清理... "})
             
@@ -344,24 +686,16 @@ class TranscriptionOrchestrator:
             print(f"[ORCHESTRATOR_ERROR] {error_message}") # 直接輸出到 Celery log
             import traceback
             tb_str = traceback.format_exc()
-            print(f"[ORCHESTRATOR_TRACEBACK]\\n{tb_str}") # 直接輸出 traceback 到 Celery log
+            print(f"[ORCHESTRATOR_TRACEBACK]\n{tb_str}") # 直接輸出 traceback 到 Celery log
             
             self._log_callback("error", {"message": error_message, "traceback": tb_str})
             return None # Indicate overall failure
         finally:
             # --- 5. 清理 ---
-            self._log_callback("log", {"message": "開始清理暫存音訊片段檔案..."})
-            cleaned_temp_count = 0
-            for f_path in temp_chunk_files_to_clean:
-                try:
-                    if os.path.exists(f_path):
-                        os.remove(f_path)
-                        cleaned_temp_count +=1
-                except Exception as e_clean:
-                    self._log_callback("warn", {"message": f"刪除暫存檔 {f_path} 失敗: {e_clean}"})
-            self._log_callback("log", {"message": f"已清理 {cleaned_temp_count}/{len(temp_chunk_files_to_clean)} 個暫存片段檔案。"})
-
+            # 先等待進行中的片段結束 (錯誤時取消尚未開始的)，再清理服務端檔案
+            chunk_pool.shutdown(wait=True, cancel_futures=True)
             # 清理 Transcriber 內部追蹤的服務端檔案 (如 Gemini File API 上的檔案)
             if self.transcriber:
                 self.transcriber.cleanup_uploaded_files()
+                self.transcriber.close()
             self._log_callback("progress", {"percentage": 100, "step_message": "所有處理完成。"})
@@ -1,21 +1,48 @@
 # backend/app/tasks/transcription_tasks.py
+from celery.signals import worker_init, worker_process_init
 from app.core.celery_app import celery_app
-from app.services.transcription_orchestrator import TranscriptionOrchestrator
-from app.core.redis_client import get_sync_redis_client # Get synchronous client
-import json
+from app.services.transcription_orchestrator import TranscriptionOrchestrator, _load_vad_model
+from app.core.redis_client import get_task_event_batcher
+import orjson
 import os
 from typing import Dict, Any, List
 
-def _publish_event_to_redis(task_id: str, event_data: Dict[str, Any]):
-    """Helper to publish events to Redis Pub/Sub for a given task_id."""
-    redis_client = get_sync_redis_client()
-    channel = f"task_events:{task_id}"
+def _preload_vad_model():
+    """Loads the Silero VAD model ahead of the first task (the orchestrator then hits the fast path)."""
+    _load_vad_model(lambda event_type, data: print(f"[VAD_PRELOAD] [{event_type.upper()}] {data.get('message', data)}"))
+
+@worker_process_init.connect
+def _preload_vad_in_pool_process(**kwargs):
+    # prefork: each child process loads its own copy once, right after the fork
+    _preload_vad_model()
+
+@worker_init.connect
+def _preload_vad_in_worker(sender=None, **kwargs):
+    # threads/solo pools run tasks inside the worker process itself. Under prefork the parent must not
+    # load torch before forking (its threads don't survive the fork); the children load it above.
+    if "prefork" not in str(getattr(sender, "pool_cls", "")):
+        _preload_vad_model()
+
+def _publish_event_to_redis(channel: str, event_data: Dict[str, Any]):
+    """Helper to publish events to a task's Redis Pub/Sub channel (task_events:{task_id}).
+
+    Events are queued and sent in pipelined batches by a background thread, so the pipeline
+    doesn't wait on a Redis round trip per log line. Call _flush_events_to_redis before the task
+    returns so everything (notably "finish") is out before task_postrun's completion notice.
+    """
     try:
-        redis_client.publish(channel, json.dumps(event_data))
+        # orjson returns bytes, which redis publishes as-is (no str -> bytes encode);
+        # numpy scalars/arrays in event data are serialized natively
+        get_task_event_batcher().emit(channel, orjson.dumps(event_data, option=orjson.OPT_SERIALIZE_NUMPY))
     except Exception as e:
         # Log this error, perhaps to Celery logger or a file,
         # as it means frontend won't get this specific update.
-        print(f"ERROR publishing event to Redis for task {task_id}: {e} (Event: {event_data.get('type')})")
+        print(f"ERROR publishing event to Redis on {channel}: {e} (Event: {event_data.get('type')})")
+
+def _flush_events_to_redis(task_id: str):
+    """Blocks until the events queued so far have been published."""
+    if not get_task_event_batcher().flush():
+        print(f"WARNING timed out flushing queued events to Redis for task {task_id}")
 
 
 @celery_app.task(bind=True, name="app.tasks.transcription_tasks.run_transcription_pipeline")
@@ -25,9 +52,11 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
     `task_id` is our custom ID for SSE streaming.
     `self.request.id` is Celery's internal task ID.
     """
+    # Channel name is built once per task; the callback closes over it
+    events_channel = f"task_events:{task_id}"
     # Define the log callback for the orchestrator
     def orchestrator_log_callback(event_type: str, data: Dict[str, Any]):
-        _publish_event_to_redis(task_id, {"type": event_type, **data})
+        _publish_event_to_redis(events_channel, {"type": event_type, **data})
 
     orchestrator_log_callback("log", {"message": f"Celery Task {self.request.id} (SSE Task ID: {task_id}) started for files: {file_paths}."})
 
@@ -39,7 +68,8 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
     if not all([google_api_key, google_model, prompt is not None]): # prompt can be empty string
         error_msg = "Celery Task: Missing required settings (API Key, Model, or Prompt)."
         orchestrator_log_callback("error", {"message": error_msg})
-        _publish_event_to_redis(task_id, {"type": "finish"}) # Ensure finish event is sent
+        _publish_event_to_redis(events_channel, {"type": "finish"}) # Ensure finish event is sent
+        _flush_events_to_redis(task_id)
         # We can raise an exception here to mark Celery task as FAILED
         raise ValueError(error_msg)
 
@@ -57,7 +87,7 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
         # If multiple files are passed, this logic needs adjustment or orchestrator needs to loop.
         if not file_paths:
             orchestrator_log_callback("error", {"message": "No file paths provided to transcription task."})
-            _publish_event_to_redis(task_id, {"type": "finish"})
+            _publish_event_to_redis(events_channel, {"type": "finish"})
             raise ValueError("No file paths provided.")
 
         primary_audio_path = file_paths[0] # Take the first file
@@ -66,7 +96,7 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
         final_srt_content = orchestrator.process_audio(primary_audio_path)
 
         if final_srt_content is not None:
-            _publish_event_to_redis(task_id, {
+            _publish_event_to_redis(events_channel, {
                 "type": "result",
                 "data": {
                     "transcription_text_srt": final_srt_content,
@@ -88,11 +118,11 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
         # orchestrator_log_callback("log", {"message": f"Traceback: {error_trace}"}) # Be careful with logging full tracebacks to client
         # Re-raise the exception so Celery marks the task as FAILED
         # This allows for retry mechanisms if configured, and proper state tracking in Celery backend.
-        _publish_event_to_redis(task_id, {"type": "finish"}) # Ensure finish event on error too
+        _publish_event_to_redis(events_channel, {"type": "finish"}) # Ensure finish event on error too
         raise
     finally:
         # Always publish a "finish" event for SSE client
-        _publish_event_to_redis(task_id, {"type": "finish"})
+        _publish_event_to_redis(events_channel, {"type": "finish"})
         orchestrator_log_callback("log", {"message": f"Celery Task {self.request.id} (SSE Task ID: {task_id}) processing finished."})
 
         # Cleanup temporary files that were created *before* calling this Celery task
@@ -105,4 +135,5 @@ def run_transcription_pipeline(self, task_id: str, file_paths: List[str], settin
                     os.remove(fp)
                     orchestrator_log_callback("log", {"message": f"Celery task cleaned up FastAPI temp file: {fp}"})
                 except OSError as e_clean:
-                    orchestrator_log_callback("warn", {"message": f"Celery task failed to clean up FastAPI temp file {fp}: {e_clean}"})
\ No newline at end of file
+                    orchestrator_log_callback("warn", {"message": f"Celery task failed to clean up FastAPI temp file {fp}: {e_clean}"})
+        _flush_events_to_redis(task_id)
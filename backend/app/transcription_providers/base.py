@@ -1,41 +1,77 @@
 # backend/app/transcription_providers/base.py
+import mimetypes
+import os
+import tempfile
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, Optional
 LogCallbackType = Optional[Callable[[str, Dict[str, Any]], None]]
 class Transcriber(ABC):
     def __init__(self, api_key: str, model_name: str, log_callback: LogCallbackType = None):
         self.api_key = api_key
         self.model_name = model_name
         self.uploaded_files_info: Dict[str, Any] = {}
+        # 上傳可能由多個執行緒同時進行，登記已上傳檔案時需加鎖
+        self._uploaded_files_lock = threading.Lock()
         self._log_callback = log_callback
     def _log(self, event_type: str, data: Dict[str, Any]):
         if self._log_callback:
             self._log_callback(event_type, data)
         else: # Fallback to print if no callback is provided
             print(f"[{event_type.upper()}] {data.get('message', data)}")
+    def _register_uploaded_file(self, file_id: str, file_obj: Any) -> None:
+        with self._uploaded_files_lock:
+            self.uploaded_files_info[file_id] = file_obj
     @abstractmethod
     def upload_file(self, file_path: str) -> Any:
         raise NotImplementedError
+    def upload_file_from_bytes(self, data: bytes, mime_type: str = "audio/wav", display_name: Optional[str] = None) -> Any:
+        # 預設實作：寫入暫存檔再交給 upload_file；可直接上傳記憶體內容的服務應覆寫此方法
+        fd, temp_filepath = tempfile.mkstemp(suffix=mimetypes.guess_extension(mime_type) or "", prefix="upload_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return self.upload_file(temp_filepath)
+        finally:
+            os.remove(temp_filepath)
     @abstractmethod
     def transcribe_file(self, uploaded_file_obj: Any, prompt: str) -> Optional[str]:
         raise NotImplementedError
+    def transcribe_file_streaming(self, uploaded_file_obj: Any, prompt: str) -> Iterator[str]:
+        # 預設實作：不支援串流的服務一次產出完整結果；失敗時不產出任何內容
+        result = self.transcribe_file(uploaded_file_obj, prompt)
+        if result:
+            yield result
     @abstractmethod
     def _delete_service_file(self, file_id: str) -> None:
         raise NotImplementedError
-    def cleanup_uploaded_files(self) -> int:
-        if not self.uploaded_files_info:
+    def close(self) -> None:
+        # 釋放服務端的其他資源 (如提示詞快取)；預設無需處理
+        pass
+    def cleanup_uploaded_files(self, max_workers: int = 8, timeout: float = 60) -> int:
+        with self._uploaded_files_lock:
+            file_ids_to_clean = list(self.uploaded_files_info.keys())
+        if not file_ids_to_clean:
             return 0
-        total_to_clean = len(self.uploaded_files_info)
+        total_to_clean = len(file_ids_to_clean)
         self._log("log", {"message": f"開始清理 {total_to_clean} 個已上傳的服務端檔案..."})
-        cleaned_count = 0
-        # ... (rest of the cleanup logic from original, using self._log) ...
-        file_ids_to_clean = list(self.uploaded_files_info.keys())
-        for file_id in file_ids_to_clean:
+        # 刪除請求彼此獨立，以執行緒池同時送出，總耗時約為 N/max_workers 次往返
+        def delete_one(file_id: str) -> bool:
             try:
                 self._delete_service_file(file_id)
-                del self.uploaded_files_info[file_id]
-                cleaned_count += 1
             except Exception as delete_err:
                 self._log("error", {"message": f"清理檔案 {file_id} 失敗: {delete_err}", "file_id": file_id})
+                return False
+            with self._uploaded_files_lock:
+                self.uploaded_files_info.pop(file_id, None)
+            return True
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, total_to_clean)), thread_name_prefix="cleanup_uploaded")
+        futures = [executor.submit(delete_one, file_id) for file_id in file_ids_to_clean]
+        done, not_done = wait(futures, timeout=timeout)
+        executor.shutdown(wait=False, cancel_futures=True) # 逾時仍未完成的刪除不再等待
+        cleaned_count = sum(1 for future in done if future.result())
+        if not_done:
+            self._log("warn", {"message": f"清理服務端檔案逾時，{len(not_done)} 個檔案未確認刪除。"})
         self._log("log", {"message": f"服務端檔案清理完畢 (成功刪除 {cleaned_count}/{total_to_clean} 個)。"})
-        return cleaned_count
\ No newline at end of file
+        return cleaned_count
@@ -1,19 +1,240 @@
 # backend/app/transcription_providers/gemini.py
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+import asyncio
+import contextlib
+import copy
+import datetime
+import functools
+import hashlib
+import io
+import logging
+import mimetypes
+import orjson
 import os
+import random
+import threading
+import tempfile
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 from .base import Transcriber, LogCallbackType
-from typing import Optional
-import sys
+from typing import Any, Dict, Iterator, List, Optional
+try:
+    import fcntl # POSIX：跨 worker 行程鎖定登錄檔
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 每個 API 金鑰各自一組 client (同 config_service._get_model_client)，不依賴 genai.configure 的全域設定：
+# threads pool 中不同金鑰的任務並行時，生成、上傳、查詢、刪除與提示詞快取都固定使用各自任務的金鑰。
+# client 可跨執行緒共用，同一金鑰的所有任務與片段重用其 gRPC channel 與 TLS 連線
+@functools.lru_cache(maxsize=8)
+def _generative_client(api_key: str) -> glm.GenerativeServiceClient:
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key}, transport="grpc")
+
+@functools.lru_cache(maxsize=8)
+def _file_client(api_key: str) -> genai_client.FileServiceClient:
+    # SDK 的子類別才有 create_file (經 discovery API 上傳)
+    return genai_client.FileServiceClient(client_options={"api_key": api_key}, transport="grpc")
+
+@functools.lru_cache(maxsize=8)
+def _cache_client(api_key: str) -> glm.CacheServiceClient:
+    return glm.CacheServiceClient(client_options={"api_key": api_key}, transport="grpc")
+
+def _bind_client(model: genai.GenerativeModel, api_key: str) -> genai.GenerativeModel:
+    # GenerativeModel 預設在第一次請求時才取用全域 client；SDK 沒有公開傳入 client 的參數，只能設定 _client
+    model._client = _generative_client(api_key)
+    return model
+
+@functools.lru_cache(maxsize=8)
+def _get_generative_model(api_key: str, model_name: str) -> genai.GenerativeModel:
+    # GenerativeModel 本身不帶任務狀態，可跨任務共用；建立時即綁定該金鑰的 client，因此以 (api_key, model_name) 為鍵。
+    # 任務狀態 (log callback、已上傳檔案、提示詞快取) 仍留在各自的 GeminiTranscriber
+    return _bind_client(genai.GenerativeModel(model_name), api_key)
+
+@functools.lru_cache(maxsize=32)
+def _prompt_part(prompt: str) -> genai.protos.Part:
+    # 同一提示詞在所有片段與任務間共用預先建好的 Part，請求時不必每次由字串轉換
+    return genai.protos.Part(text=prompt)
+
+# File API 單檔上限 2 GB；超過或非音訊/影片的檔案在上傳前即拒絕
+_GEMINI_MAX_FILE_BYTES = 2 * 1024 ** 3
+_GEMINI_MEDIA_MIME_PREFIXES = ("audio/", "video/")
+
+class _PendingFilePoller:
+    """One background thread polls every uploaded file still PROCESSING and resolves its future when the state changes.
+
+    Each file keeps its own exponential backoff (0.5 s doubling to a 10 s cap, plus jitter), so
+    upload threads wait on a future instead of each running a sleep/get_file loop. Files are
+    polled with the client of the API key they were uploaded under; a failed lookup is retried
+    on the same backoff and only fails the upload after max_errors consecutive errors.
+    """
+    def __init__(self, initial_interval: float = 0.5, max_interval: float = 10.0, max_errors: int = 5):
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._max_errors = max_errors
+        self._start_lock = threading.Lock()
+        self._cond: Optional[threading.Condition] = None
+        self._pending: Dict[tuple, list] = {} # (api_key, file_name) -> [future, next_check, interval, errors]
+        self._pid: Optional[int] = None
+
+    def watch(self, api_key: str, file_name: str) -> Future:
+        # 執行緒於實際使用的行程中啟動 (prefork 子行程各自啟動)
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._cond = threading.Condition()
+                    self._pending = {}
+                    threading.Thread(target=self._run, name="gemini-file-poller", daemon=True).start()
+                    self._pid = os.getpid()
+        future: Future = Future()
+        with self._cond:
+            self._pending[(api_key, file_name)] = [future, time.monotonic() + self._initial_interval, self._initial_interval, 0]
+            self._cond.notify()
+        return future
+
+    def discard(self, api_key: str, file_name: str) -> None:
+        if self._pid == os.getpid():
+            with self._cond:
+                self._pending.pop((api_key, file_name), None)
+
+    def _backoff(self, entry: list) -> None:
+        entry[2] = min(entry[2] * 2, self._max_interval)
+        entry[1] = time.monotonic() + entry[2] + random.uniform(0, 0.1)
+
+    def _run(self) -> None:
+        cond = self._cond
+        while True:
+            with cond:
+                while True:
+                    now = time.monotonic()
+                    due = [(key, entry) for key, entry in self._pending.items() if entry[1] <= now]
+                    if due:
+                        break
+                    next_check = min((entry[1] for entry in self._pending.values()), default=None)
+                    cond.wait(None if next_check is None else next_check - now)
+            for key, entry in due:
+                api_key, file_name = key
+                try:
+                    file_obj = genai.types.File(_file_client(api_key).get_file(name=file_name))
+                except Exception as e:
+                    with cond:
+                        if self._pending.get(key) is not entry:
+                            continue # 等待端已逾時放棄
+                        entry[3] += 1
+                        if entry[3] >= self._max_errors:
+                            del self._pending[key]
+                            entry[0].set_exception(e)
+                        else:
+                            # 暫時性錯誤 (網路、配額) 依退避間隔重試
+                            logger.warning("get_file failed for %s (attempt %d/%d): %s", file_name, entry[3], self._max_errors, e)
+                            self._backoff(entry)
+                    continue
+                logger.debug("uploaded_file state=%s name=%s", file_obj.state.name, file_obj.name)
+                with cond:
+                    if self._pending.get(key) is not entry:
+                        continue # 等待端已逾時放棄
+                    entry[3] = 0
+                    if file_obj.state.name == "PROCESSING":
+                        self._backoff(entry)
+                    else:
+                        del self._pending[key]
+                        entry[0].set_result(file_obj)
+
+_FILE_STATE_POLLER = _PendingFilePoller()
+
+# Gemini File API 上的檔案 48 小時後失效；登錄只保留 47 小時，避免取回即將過期的檔案
+_GEMINI_FILE_TTL_SECONDS = 47 * 3600
+
+def _sha256_file(file_path: str, buffer_size: int = 1 << 20) -> str:
+    # 以固定 1 MiB 緩衝區串流讀取：readinto 重複使用同一塊記憶體，不因檔案大小或每次讀取而配置新的 bytes
+    digest = hashlib.sha256()
+    buffer = memoryview(bytearray(buffer_size))
+    with open(file_path, "rb", buffering=0) as f:
+        while num_read := f.readinto(buffer):
+            digest.update(buffer[:num_read])
+    return digest.hexdigest()
+
+class GeminiFileRegistry:
+    """Persistent map of audio content key -> Gemini file name, shared by worker processes through a JSON file."""
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "rb") as f:
+                return orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return {}
+
+    def _write(self, entries: Dict[str, dict]) -> None:
+        # 先寫暫存檔再取代，讀取端不會看到寫到一半的內容
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".gemini_registry_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(entries))
+        os.replace(temp_path, self.path)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._locked():
+            entry = self._read().get(key)
+        if entry and time.time() - entry.get("uploaded_at", 0) < _GEMINI_FILE_TTL_SECONDS:
+            return entry.get("name")
+        return None
+
+    def put(self, key: str, file_name: str) -> None:
+        with self._locked():
+            now = time.time()
+            entries = {k: v for k, v in self._read().items() if now - v.get("uploaded_at", 0) < _GEMINI_FILE_TTL_SECONDS}
+            entries[key] = {"name": file_name, "uploaded_at": now}
+            self._write(entries)
+
+    def discard(self, key: str) -> None:
+        with self._locked():
+            entries = self._read()
+            if entries.pop(key, None) is not None:
+                self._write(entries)
 
 class GeminiTranscriber(Transcriber):
-    def __init__(self, api_key: str, model_name: str, log_callback: LogCallbackType = None):
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        log_callback: LogCallbackType = None,
+        max_upload_concurrency: int = 6,
+        file_registry: Optional[GeminiFileRegistry] = None,
+        prompt_cache_min_tokens: int = 1024
+    ):
         super().__init__(api_key, model_name, log_callback)
         self.log_callback = log_callback # Explicitly set it on the instance for clarity/safety
+        self._has_callback = callable(log_callback) # 供 _log 快速判斷，無回呼時跳過非錯誤事件
+        self.max_upload_concurrency = max(1, max_upload_concurrency) # upload_files 同時進行的上傳數上限
+        # 設定時，相同內容 (同一 API 金鑰) 的音訊重用先前上傳的檔案；登錄鍵以金鑰雜湊區分，不儲存金鑰本身
+        self.file_registry = file_registry
+        self._api_key_id = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        # 提示詞達 prompt_cache_min_tokens (模型的 context cache 下限；0 表示停用) 時，
+        # 第一次轉錄前以 cachedContents 快取一次，之後每個片段只送音訊
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+        self._prompt_cache_lock = threading.Lock()
+        self._prompt_models: Dict[str, Optional[genai.GenerativeModel]] = {} # prompt -> 綁定快取的模型 (None: 不使用快取)
+        self._prompt_caches: List[genai.protos.CachedContent] = []
         self.model: Optional[genai.GenerativeModel] = None
         try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(self.model_name) # Uses model_name directly
+            self.model = _get_generative_model(self.api_key, self.model_name) # Uses model_name directly
             self._log("log", {"message": f"Gemini API 配置成功，使用模型: {self.model_name}"})
             self.uploaded_files_info = {} # Store uploaded file info {gemini_file_name: genai.File}
         except Exception as e:
@@ -21,43 +242,112 @@ class GeminiTranscriber(Transcriber):
             raise # Re-raise exception to be caught by orchestrator
 
     def _log(self, event_type: str, data: dict):
+        # 沒有回呼時只有錯誤需要寫入 log，其餘事件 (如輪詢狀態) 直接略過
+        if not self._has_callback and event_type != "error":
+            return
         # Ensure data is a dict, as expected by the callback
         if not isinstance(data, dict):
-            print(f"[GEMINI_TRANSCRIBER_LOG_WARNING] _log called with non-dict data: {data}")
+            logger.warning("_log called with non-dict data: %s", data)
             log_data = {"message": str(data)}
         else:
             log_data = data
 
-        # If it's an error, also print directly to Celery worker logs for easier debugging
+        # If it's an error, also log directly to the Celery worker logs for easier debugging
         if event_type == "error":
-            print(f"[GEMINI_TRANSCRIBER_ERROR] {log_data}")
+            logger.error("%s", log_data)
 
-        if self.log_callback:
+        if self._has_callback:
             try:
                 self.log_callback(event_type, log_data)
             except Exception as e_cb:
                 # Log callback failure to stderr (Celery worker log)
-                print(f"[GEMINI_TRANSCRIBER_LOG_CALLBACK_ERROR] Failed to send log via callback: {e_cb} | Original log: {event_type} - {log_data}", file=sys.stderr)
+                logger.error("Failed to send log via callback: %s | Original log: %s - %s", e_cb, event_type, log_data)
 
     def upload_file(self, file_path: str) -> Optional[genai.types.File]:
         filename = os.path.basename(file_path)
-        print(f"upload_file: {filename}")
+        logger.debug("upload_file: %s", filename)
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError as e:
+            self._log("error", {"message": f"無法讀取檔案 '{filename}': {e}"})
+            return None
+        if not self._validate_upload(filename, file_size, mimetypes.guess_type(file_path)[0]):
+            return None
+        content_sha = _sha256_file(file_path) if self.file_registry is not None else None
+        return self._upload_and_wait(file_path, filename, content_sha=content_sha)
+
+    def upload_files(self, file_paths: List[str], max_concurrency: Optional[int] = None) -> Dict[str, Optional[genai.types.File]]:
+        # 上傳與服務端處理皆為網路等待，以有上限的執行緒池同時進行；回傳 {路徑: 檔案物件 (失敗為 None)}，依輸入順序
+        max_workers = max(1, min(max_concurrency or self.max_upload_concurrency, len(file_paths) or 1))
+        results: Dict[str, Optional[genai.types.File]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini_upload") as executor:
+            futures = {executor.submit(self.upload_file, path): path for path in file_paths}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result() # upload_file 自行記錄錯誤並回傳 None
+        return {path: results[path] for path in file_paths}
+
+    def upload_file_from_bytes(self, data: bytes, mime_type: str = "audio/wav", display_name: Optional[str] = None) -> Optional[genai.types.File]:
+        # File API 接受 file-like 物件 (需指定 mime_type)，直接從記憶體上傳，不經過磁碟
+        filename = display_name or "audio_chunk"
+        if not self._validate_upload(filename, len(data), mime_type):
+            return None
+        content_sha = hashlib.sha256(data).hexdigest() if self.file_registry is not None else None
+        return self._upload_and_wait(io.BytesIO(data), filename, mime_type=mime_type, content_sha=content_sha)
+
+    def _validate_upload(self, filename: str, size: int, mime_type: Optional[str]) -> bool:
+        # 無法判斷類型 (未知副檔名) 時交由服務端判斷
+        if mime_type and not mime_type.startswith(_GEMINI_MEDIA_MIME_PREFIXES):
+            self._log("error", {"message": f"檔案 '{filename}' 類型 {mime_type} 不是音訊或影片，不上傳。"})
+            return False
+        if size > _GEMINI_MAX_FILE_BYTES:
+            self._log("error", {"message": f"檔案 '{filename}' 大小 {size / 1024 ** 3:.2f} GB 超過 Gemini File API 上限 (2 GB)，不上傳。"})
+            return False
+        return True
+
+    def _get_registered_file(self, registry_key: str, filename: str) -> Optional[genai.types.File]:
+        try:
+            file_id = self.file_registry.get(registry_key)
+            if not file_id:
+                return None
+            registered_file = genai.types.File(_file_client(self.api_key).get_file(name=file_id))
+            if registered_file.state.name == "ACTIVE":
+                self._log("log", {"message": f"重用先前上傳的 Gemini 檔案 '{filename}' (ID: {registered_file.name})"})
+                return registered_file
+            self.file_registry.discard(registry_key)
+        except Exception as e:
+            self._log("warn", {"message": f"無法重用先前上傳的 Gemini 檔案 '{filename}'，將重新上傳: {e}"})
+            try:
+                self.file_registry.discard(registry_key)
+            except Exception:
+                pass
+        return None
+
+    def _upload_and_wait(self, source, filename: str, mime_type: Optional[str] = None, content_sha: Optional[str] = None) -> Optional[genai.types.File]:
+        registry_key = None
+        if self.file_registry is not None and content_sha:
+            registry_key = f"{self._api_key_id}:{content_sha}"
+            registered_file = self._get_registered_file(registry_key, filename)
+            if registered_file is not None:
+                return registered_file
         self._log("log", {"message": f"開始上傳檔案到 Gemini: {filename}..."})
         try:
             # display_name helps identify the file in the Gemini console
-            uploaded_file = genai.upload_file(path=file_path, display_name=filename)
-            print(f"uploaded_file: {uploaded_file}")
+            if mime_type is None and isinstance(source, str):
+                mime_type = mimetypes.guess_type(source)[0]
+            uploaded_file = genai.types.File(_file_client(self.api_key).create_file(path=source, mime_type=mime_type, display_name=filename))
+            logger.debug("uploaded_file state=%s name=%s", uploaded_file.state.name, uploaded_file.name)
             self._log("log", {"message": f"Gemini 檔案 '{filename}' 上傳中，等待處理... (ID: {uploaded_file.name})"})
-            # Polling for ACTIVE state
-            polling_interval = 5 # seconds
+            # Wait for ACTIVE state
+            # 由共用的輪詢執行緒查詢狀態 (各檔案各自指數退避)，此執行緒只等待結果，不自行 sleep 輪詢
             max_wait_time = 300 # 5 minutes
-            elapsed_time = 0
-            while uploaded_file.state.name == "PROCESSING" and elapsed_time < max_wait_time:
-                time.sleep(polling_interval)
-                elapsed_time += polling_interval
-                uploaded_file = genai.get_file(name=uploaded_file.name)
-                print(f"uploaded_file: {uploaded_file}")
-                self._log("log", {"message": f"Gemini 檔案 '{filename}' 狀態: {uploaded_file.state.name} (已等待 {elapsed_time}s)"})
+            if uploaded_file.state.name == "PROCESSING":
+                waiting_started = time.monotonic()
+                state_future = _FILE_STATE_POLLER.watch(self.api_key, uploaded_file.name)
+                try:
+                    uploaded_file = state_future.result(timeout=max_wait_time)
+                except FutureTimeoutError:
+                    _FILE_STATE_POLLER.discard(self.api_key, uploaded_file.name) # 仍為 PROCESSING，以下當作失敗處理
+                self._log("log", {"message": f"Gemini 檔案 '{filename}' 狀態: {uploaded_file.state.name} (已等待 {time.monotonic() - waiting_started:.1f}s)"})
             if uploaded_file.state.name != "ACTIVE":
                 self._log("error", {
                     "message": f"Gemini 檔案 '{filename}' (ID: {uploaded_file.name}) 處理失敗或狀態非 ACTIVE: {uploaded_file.state.name}",
@@ -72,11 +362,69 @@ class GeminiTranscriber(Transcriber):
                     self._log("warn", {"message": f"嘗試刪除 Gemini 中處理失敗的檔案 {uploaded_file.name} 時發生錯誤: {del_e}"})
                 return None # Indicate failure
             self._log("log", {"message": f"Gemini 檔案 '{filename}' (ID: {uploaded_file.name}) 處理完成，狀態: ACTIVE"})
-            self.uploaded_files_info[uploaded_file.name] = uploaded_file # Store by Gemini file name (ID)
+            if registry_key:
+                # 登錄供之後的任務重用，不列入本任務結束時的清理 (由 Gemini 到期後自動刪除)
+                try:
+                    self.file_registry.put(registry_key, uploaded_file.name)
+                    return uploaded_file
+                except Exception as e_registry:
+                    self._log("warn", {"message": f"無法登錄 Gemini 檔案 '{filename}' 供重用: {e_registry}"})
+            self._register_uploaded_file(uploaded_file.name, uploaded_file) # Store by Gemini file name (ID)
             return uploaded_file
         except Exception as e:
             self._log("error", {"message": f"上傳或處理檔案 '{filename}' 至 Gemini 失敗: {e}"})
             return None # Indicate failure
+    def _cached_prompt_model(self, prompt: str) -> Optional[genai.GenerativeModel]:
+        with self._prompt_cache_lock:
+            if prompt in self._prompt_models:
+                return self._prompt_models[prompt]
+            cached_model = None
+            # token 數不會超過字元數，過短的提示詞不必呼叫 count_tokens
+            if self.prompt_cache_min_tokens and len(prompt) >= self.prompt_cache_min_tokens:
+                try:
+                    if self.model.count_tokens(prompt).total_tokens >= self.prompt_cache_min_tokens:
+                        cache = _cache_client(self.api_key).create_cached_content(cached_content=genai.protos.CachedContent(
+                            model=self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}",
+                            system_instruction=genai.protos.Content(parts=[_prompt_part(prompt)]),
+                            ttl=datetime.timedelta(hours=1)
+                        ))
+                        self._prompt_caches.append(cache)
+                        # from_cached_content 只讀取快取的 model 與 name
+                        cached_model = _bind_client(genai.GenerativeModel.from_cached_content(cached_content=cache), self.api_key)
+                        self._log("log", {"message": f"已快取轉錄提示詞 (ID: {cache.name})。"})
+                except Exception as e:
+                    self._log("warn", {"message": f"無法快取轉錄提示詞，改為每次請求附帶提示詞: {e}"})
+            self._prompt_models[prompt] = cached_model
+            return cached_model
+    def _model_and_contents(self, uploaded_file_obj: genai.types.File, prompt: str) -> tuple:
+        # 提示詞已快取時只送音訊檔案
+        cached_model = self._cached_prompt_model(prompt)
+        if cached_model is not None:
+            return cached_model, [uploaded_file_obj]
+        return self.model, [_prompt_part(prompt), uploaded_file_obj]
+    def close(self) -> None:
+        with self._prompt_cache_lock:
+            caches, self._prompt_caches = self._prompt_caches, []
+            self._prompt_models.clear()
+        for cache in caches:
+            try:
+                _cache_client(self.api_key).delete_cached_content(name=cache.name)
+            except Exception as e:
+                self._log("warn", {"message": f"刪除提示詞快取 {cache.name} 失敗: {e}"})
+    def _response_text(self, response: Any, original_filename: str) -> Optional[str]:
+        # 同步與非同步轉錄共用的回應處理：有文字即回傳，否則記錄失敗原因並回傳 None
+        if hasattr(response, 'text') and response.text:
+            self._log("log", {"message": f"檔案 '{original_filename}' 轉錄成功。"})
+            return response.text
+        self._log_empty_response(response)
+        return None
+    def _log_empty_response(self, response: Any) -> None:
+        # Check for safety ratings or other reasons for no text
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            reason = response.prompt_feedback.block_reason.name
+            self._log("error", {"message": f"轉錄失敗：Gemini 因 '{reason}' 而阻擋了回應。"})
+        else:
+            self._log("error", {"message": "轉錄失敗：Gemini 模型未返回預期文字，也無明確阻擋原因。"})
     def transcribe_file(self, uploaded_file_obj: genai.types.File, prompt: str) -> Optional[str]:
         if not self.model:
             self._log("error", {"message": "Gemini 模型未初始化，無法轉錄。"})
@@ -88,28 +436,85 @@ class GeminiTranscriber(Transcriber):
             # The prompt should guide the model on how to process the audio.
             # The FileDataPart object contains the URI of the uploaded file.
             # The request can be a list of parts: [prompt_string, file_data_part]
-            response = self.model.generate_content(
-                [prompt, uploaded_file_obj],
+            model, contents = self._model_and_contents(uploaded_file_obj, prompt)
+            response = model.generate_content(
+                contents,
                 request_options={"timeout": 600} # 10 minutes timeout
             )
-            if hasattr(response, 'text') and response.text:
+            return self._response_text(response, original_filename)
+        except Exception as e:
+            self._log("error", {"message": f"請求 Gemini 轉錄檔案 '{original_filename}' 時發生錯誤: {e}"})
+            return None
+    async def _transcribe_file_async(self, uploaded_file_obj: genai.types.File, prompt: str, async_client: glm.GenerativeServiceAsyncClient) -> Optional[str]:
+        original_filename = uploaded_file_obj.display_name or uploaded_file_obj.name
+        self._log("log", {"message": f"請求 Gemini 轉錄檔案 '{original_filename}' (ID: {uploaded_file_obj.name})..."})
+        try:
+            shared_model, contents = await asyncio.to_thread(self._model_and_contents, uploaded_file_obj, prompt)
+            # 快取的模型由所有任務共用，不修改它；以淺複本帶入此次呼叫 (此 event loop) 的 async client
+            model = copy.copy(shared_model)
+            model._async_client = async_client
+            response = await model.generate_content_async(
+                contents,
+                request_options={"timeout": 600} # 10 minutes timeout
+            )
+            return self._response_text(response, original_filename)
+        except Exception as e:
+            self._log("error", {"message": f"請求 Gemini 轉錄檔案 '{original_filename}' 時發生錯誤: {e}"})
+            return None
+    async def transcribe_files_async(self, uploaded_file_objs: List[genai.types.File], prompt: str, concurrency: int = 8) -> List[Optional[str]]:
+        # 多個檔案的轉錄請求同時送出 (以 Semaphore 限制同時進行的數量)；結果依輸入順序，失敗為 None
+        if not self.model:
+            self._log("error", {"message": "Gemini 模型未初始化，無法轉錄。"})
+            return [None] * len(uploaded_file_objs)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        # grpc.aio client 綁定於建立它的 event loop：每次呼叫 (在目前的 loop 內) 建立一個，結束時關閉
+        async with glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key}) as async_client:
+            async def transcribe_one(uploaded_file_obj):
+                async with semaphore:
+                    return await self._transcribe_file_async(uploaded_file_obj, prompt, async_client)
+            return list(await asyncio.gather(*(transcribe_one(f) for f in uploaded_file_objs)))
+    def transcribe_files(self, uploaded_file_objs: List[genai.types.File], prompt: str, concurrency: int = 8) -> List[Optional[str]]:
+        # 同步呼叫端 (Celery) 使用：經 asyncio.run 走非同步路徑，每次都要為新的 loop 建立 grpc.aio client 與連線，
+        # 因此改以執行緒池並行同步的 transcribe_file，重用該金鑰共用的 gRPC 連線
+        if not uploaded_file_objs:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(uploaded_file_objs))), thread_name_prefix="gemini_transcribe") as executor:
+            return list(executor.map(lambda f: self.transcribe_file(f, prompt), uploaded_file_objs))
+    def transcribe_file_streaming(self, uploaded_file_obj: genai.types.File, prompt: str) -> Iterator[str]:
+        # 逐段產出模型回應文字，呼叫端可在文字到達時即處理；中途失敗會記錄錯誤後重新拋出，
+        # 讓呼叫端捨棄已收到的不完整結果
+        if not self.model:
+            self._log("error", {"message": "Gemini 模型未初始化，無法轉錄。"})
+            return
+        original_filename = uploaded_file_obj.display_name or uploaded_file_obj.name
+        self._log("log", {"message": f"請求 Gemini 串流轉錄檔案 '{original_filename}' (ID: {uploaded_file_obj.name})..."})
+        try:
+            model, contents = self._model_and_contents(uploaded_file_obj, prompt)
+            response = model.generate_content(
+                contents,
+                stream=True,
+                request_options={"timeout": 600} # 10 minutes timeout
+            )
+            received_chars = 0
+            for response_chunk in response:
+                try:
+                    text = response_chunk.text
+                except ValueError:
+                    continue # 此段沒有文字 (例如只帶結束原因)
+                if text:
+                    received_chars += len(text)
+                    yield text
+            if received_chars:
                 self._log("log", {"message": f"檔案 '{original_filename}' 轉錄成功。"})
-                return response.text
             else:
-                # Check for safety ratings or other reasons for no text
-                if response.prompt_feedback and response.prompt_feedback.block_reason:
-                     reason = response.prompt_feedback.block_reason.name
-                     self._log("error", {"message": f"轉錄失敗：Gemini 因 '{reason}' 而阻擋了回應。"})
-                else:
-                    self._log("error", {"message": "轉錄失敗：Gemini 模型未返回預期文字，也無明確阻擋原因。"})
-                return None
+                self._log_empty_response(response)
         except Exception as e:
             self._log("error", {"message": f"請求 Gemini 轉錄檔案 '{original_filename}' 時發生錯誤: {e}"})
-            return None
+            raise
     def _delete_service_file(self, file_id: str) -> None: # file_id is uploaded_file.name
         self._log("log", {"message": f"嘗試刪除 Gemini 檔案 (ID: {file_id})..."})
         try:
-            genai.delete_file(name=file_id)
+            _file_client(self.api_key).delete_file(name=file_id)
             self._log("log", {"message": f"Gemini 檔案 (ID: {file_id}) 已成功刪除。"})
         except Exception as e:
             # Log the error but don't necessarily re-raise if part of a larger cleanup
@@ -1,7 +1,11 @@
 # backend/celery_worker.py
 from app.core.celery_app import celery_app
 # This script is intended to be run with the celery worker command:
-# celery -A celery_worker.celery_app worker -l INFO -P eventlet (or gevent)
+# celery -A celery_worker.celery_app worker -l INFO
+# The pool defaults to threads with concurrency 8 (see CELERY_WORKER_POOL / CELERY_WORKER_CONCURRENCY
+# in app/core/config.py); override per run with e.g. `-P threads -c 16`.
+# The gevent pool must be selected on the command line (`-P gevent -c 200`): celery then monkey-patches
+# before importing anything else. Setting CELERY_WORKER_POOL=gevent alone falls back to threads.
 # Make sure this file is in Python's path, or adjust -A path.
 # Typically, you run this from the `backend` directory.
 # Example: celery -A app.core.celery_app worker -l INFO
@@ -6,7 +6,24 @@ app.include_router(settings_router.router)
 app.include_router(transcribe_router.router)
 app.include_router(gemini_router.router)
 if __name__ == "__main__":
+    import os
     import uvicorn
     # This is for direct execution, e.g. `python main.py`
-    # For production, use `uvicorn main:app --host 0.0.0.0 --port 8000 --reload`
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One event loop per worker process. Defaults to a single worker: each one imports torch (via the
+    # transcription task module) and warms the Gemini client, so one per core is costly on a dev machine.
+    # Set WEB_CONCURRENCY to run more; SSE and task state live in Redis/Celery, so workers don't share
+    # in-process state. Multiple workers need the "main:app" import string.
+    # loop/http "auto" pick uvloop and httptools (installed by uvicorn[standard]) where available.
+    # For production, use `gunicorn -k uvicorn.workers.UvicornWorker -w $WEB_CONCURRENCY -b 0.0.0.0:8000 main:app`
+    # For development, use `uvicorn main:app --host 0.0.0.0 --port 8000 --reload`
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    # Application loggers ("app.*") go to stderr next to uvicorn's own; passed as log_config so every
+    # worker process applies it. Per-frame SSE chatter is logged at DEBUG; raise/lower the level here
+    # per deployment (or pass --log-config when launching uvicorn/gunicorn directly).
+    import copy
+    from uvicorn.config import LOGGING_CONFIG
+    log_config = copy.deepcopy(LOGGING_CONFIG)
+    log_config["formatters"]["app"] = {"format": "%(asctime)s %(levelname)s %(name)s: %(message)s"}
+    log_config["handlers"]["app"] = {"class": "logging.StreamHandler", "formatter": "app", "stream": "ext://sys.stderr"}
+    log_config["loggers"]["app"] = {"handlers": ["app"], "level": "INFO", "propagate": False}
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers, loop="auto", http="auto", log_config=log_config)